@@ -0,0 +1,126 @@
+import hashlib
+import time
+
+from django.core.cache import cache
+from django.db import transaction
+from django.utils.http import urlencode
+
+RESPONSE_CACHE_TIMEOUT = 60 * 60
+
+# Версия всех списков произведений: меняется при любом изменении
+# произведения, его жанров или рейтинга.
+TITLES_VERSION_KEY = 'titles:version'
+# Версия для всех произведений сразу: меняется при удалении жанров
+# и категорий, когда связанные произведения уже не найти.
+CATALOGUE_VERSION_KEY = 'titles:catalogue:version'
+# Версия количеств произведений в выборках: меняется при всех изменениях
+# произведений, кроме рейтинга, от которого фильтры не зависят.
+TITLE_COUNTS_VERSION_KEY = 'titles:counts:version'
+GENRES_VERSION_KEY = 'genres:version'
+CATEGORIES_VERSION_KEY = 'categories:version'
+# Меняется при изменении пользователей, чьи имена выводятся
+# в отзывах и комментариях.
+USERS_VERSION_KEY = 'users:version'
+
+
+def title_version_key(title_id):
+    return f'titles:{title_id}:version'
+
+
+def reviews_version_key(title_id):
+    return f'titles:{title_id}:reviews:version'
+
+
+def comments_version_key(review_id):
+    return f'reviews:{review_id}:comments:version'
+
+
+def _new_version():
+    """Версия из времени не повторяется после очистки кэша."""
+    return time.time_ns()
+
+
+def get_versions(*keys):
+    """
+    Версии по ключам. Отсутствующие в кэше версии создаются:
+    после очистки кэша все ответы считаются измененными.
+    """
+    versions = cache.get_many(keys)
+    missing = {key: _new_version() for key in keys if key not in versions}
+    for key, version in missing.items():
+        cache.add(key, version, None)
+    if missing:
+        versions.update(cache.get_many(missing))
+    return tuple(versions.get(key) for key in keys)
+
+
+def _query_signature(request):
+    params = sorted(
+        (key, value)
+        for key, values in request.query_params.lists()
+        for value in values
+    )
+    signature = f'{request.get_host()}?{urlencode(params)}'
+    return hashlib.md5(signature.encode()).hexdigest()
+
+
+def title_list_key(request, kind='list'):
+    """
+    Ключ ответа по всем произведениям: версия списков
+    и параметры запроса. kind различает эндпоинты.
+    """
+    version, = get_versions(TITLES_VERSION_KEY)
+    return f'titles:{kind}:{version}:{_query_signature(request)}'
+
+
+def title_detail_key(title_id, request, version_keys):
+    """
+    Ключ произведения: версии, от которых зависит ответ (само
+    произведение, жанры и категории, встроенные данные), и параметры.
+    """
+    versions = ':'.join(map(str, get_versions(*version_keys)))
+    return (
+        f'titles:detail:{title_id}:{versions}:{_query_signature(request)}'
+    )
+
+
+def _set_versions(keys):
+    version = _new_version()
+    cache.set_many({key: version for key in keys}, None)
+
+
+def invalidate(keys):
+    """
+    Меняет версии сразу и еще раз после коммита: ответ, собранный
+    другим запросом до коммита, не останется под новой версией.
+    """
+    keys = tuple(keys)
+    _set_versions(keys)
+    transaction.on_commit(lambda: _set_versions(keys))
+
+
+def invalidate_titles(title_ids=(), counts=True):
+    """
+    Сбрасывает закэшированные произведения и все страницы списка.
+    counts=False оставляет закэшированные количества произведений.
+    """
+    invalidate([
+        *(title_version_key(title_id) for title_id in title_ids),
+        TITLES_VERSION_KEY,
+        *((TITLE_COUNTS_VERSION_KEY,) if counts else ()),
+    ])
+
+
+def invalidate_discussions(title_ids=(), review_ids=()):
+    """Сбрасывает списки отзывов произведений и комментариев отзывов."""
+    invalidate([
+        *(reviews_version_key(title_id) for title_id in title_ids),
+        *(comments_version_key(review_id) for review_id in review_ids),
+    ])
+
+
+def invalidate_catalogue():
+    """Сбрасывает все ответы после удаления жанров или категорий."""
+    invalidate([
+        CATALOGUE_VERSION_KEY, TITLES_VERSION_KEY, TITLE_COUNTS_VERSION_KEY
+    ])
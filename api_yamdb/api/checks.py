@@ -0,0 +1,27 @@
+from django.conf import settings
+from django.core.exceptions import ImproperlyConfigured
+
+# Бэкенды, у которых каждый процесс видит только свой кэш.
+PROCESS_LOCAL_CACHES = (
+    'django.core.cache.backends.locmem.LocMemCache',
+    'django.core.cache.backends.dummy.DummyCache',
+)
+
+
+def check_shared_cache():
+    """
+    Версии кэша ответов, ETag и Last-Modified, рейтинг-листы
+    и индекс подсказок согласуются между процессами только через
+    кэш. Вне режима отладки он должен быть общим для всех процессов.
+    Проверка вызывается из ApiConfig.ready, а не как системная:
+    gunicorn и uwsgi системные проверки не выполняют.
+    """
+    backend = settings.CACHES['default']['BACKEND']
+    if settings.DEBUG or backend not in PROCESS_LOCAL_CACHES:
+        return
+    raise ImproperlyConfigured(
+        f'Кэш {backend} не общий для процессов: другие процессы будут '
+        'отдавать устаревшие ответы и 304. Укажите в CACHES общий кэш '
+        'с атомарным incr, например '
+        'django.core.cache.backends.memcached.PyMemcacheCache.'
+    )
@@ -1,19 +1,101 @@
 from django_filters import rest_framework as filters
+from rest_framework.filters import (
+    BaseFilterBackend, OrderingFilter, SearchFilter
+)
 
 from reviews.models import Title
+from reviews.search import get_search_backend, normalize_text
+
+
+class CharInFilter(filters.BaseInFilter, filters.CharFilter):
+    """Список значений через запятую."""
 
 
 class TitleFilter(filters.FilterSet):
-    genre = filters.CharFilter(field_name='genre__slug', lookup_expr='exact')
-    category = filters.CharFilter(
-        field_name='category__slug',
-        lookup_expr='exact'
-    )
-    name = filters.CharFilter(
-        field_name='name',
-        lookup_expr='icontains'
+    GENRE_ANY = 'any'
+    GENRE_ALL = 'all'
+
+    genre = CharInFilter(method='filter_genre')
+    genre_mode = filters.ChoiceFilter(
+        choices=((GENRE_ANY, GENRE_ANY), (GENRE_ALL, GENRE_ALL)),
+        method='filter_genre_mode'
     )
+    category = CharInFilter(field_name='category__slug', lookup_expr='in')
+    year_min = filters.NumberFilter(field_name='year', lookup_expr='gte')
+    year_max = filters.NumberFilter(field_name='year', lookup_expr='lte')
+    name = filters.CharFilter(method='filter_name')
 
     class Meta:
         model = Title
         fields = ('genre', 'category', 'year', 'name')
+
+    def filter_genre(self, queryset, name, value):
+        """
+        Жанры проверяются полусоединением id IN (подзапрос к
+        промежуточной таблице), а не JOIN: произведение с несколькими
+        подходящими жанрами не повторяется в выдаче. В отличие от
+        коррелированного EXISTS, такой подзапрос SQLite выполняет
+        от индекса жанра, не перебирая все произведения.
+        В режиме all нужен каждый жанр.
+        """
+        genres = Title.genre.through.objects.values('title_id')
+        if self.form.cleaned_data.get('genre_mode') == self.GENRE_ALL:
+            for slug in set(value):
+                queryset = queryset.filter(
+                    pk__in=genres.filter(genre__slug=slug)
+                )
+            return queryset
+        return queryset.filter(pk__in=genres.filter(genre__slug__in=value))
+
+    def filter_genre_mode(self, queryset, name, value):
+        """Режим учитывается в filter_genre."""
+        return queryset
+
+    def filter_name(self, queryset, name, value):
+        """Подстрока в названии без учета регистра, в том числе кириллицы."""
+        return get_search_backend().filter_name(queryset, value)
+
+
+class StableOrderingFilter(OrderingFilter):
+    """
+    Сортировка с добавлением первичного ключа в конец,
+    чтобы страницы с одинаковыми значениями не перемешивались.
+    Направление ключа совпадает с первым полем, и составной индекс
+    (поле, id) читается целиком в одну сторону.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        ordering = list(super().get_ordering(request, queryset, view) or ())
+        if ordering and not {'pk', '-pk', 'id', '-id'} & set(ordering):
+            ordering.append('-id' if ordering[0].startswith('-') else 'id')
+        return ordering
+
+
+class TitleSearchFilter(BaseFilterBackend):
+    """
+    Полнотекстовый поиск ?search= по названию и описанию через
+    бэкенд из настройки TITLE_SEARCH_BACKEND. Без ?ordering=
+    результаты идут по релевантности.
+    """
+    search_param = 'search'
+
+    def filter_queryset(self, request, queryset, view):
+        query = request.query_params.get(self.search_param, '').strip()
+        if not query:
+            return queryset
+        queryset = get_search_backend().search(queryset, query)
+        if request.query_params.get(OrderingFilter.ordering_param):
+            return queryset
+        return queryset.order_by('search_rank', 'id')
+
+
+class NormalizedSearchFilter(SearchFilter):
+    """
+    SearchFilter по нормализованным полям: слова запроса приводятся
+    к тому же виду, что и normalized_name.
+    """
+
+    def get_search_terms(self, request):
+        return [
+            normalize_text(term) for term in super().get_search_terms(request)
+        ]
@@ -0,0 +1,115 @@
+import json
+import timeit
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+
+from api.serializers import (
+    TitleFastReadSerializer, TitleReadSerializer, TitleRecord
+)
+from reviews.models import Category, Genre, Title
+
+GENRES_PER_TITLE = 3
+
+
+class Command(BaseCommand):
+    help = (
+        'Сравнение скорости TitleReadSerializer и TitleFastReadSerializer '
+        'на странице списка произведений с проверкой одинакового вывода.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--generate', type=int, default=0, metavar='N',
+            help='Создать N произведений на время замера и удалить после'
+        )
+        parser.add_argument(
+            '--page-size', type=int, default=100,
+            help='Количество произведений в сериализуемой странице'
+        )
+        parser.add_argument(
+            '--repeat', type=int, default=20,
+            help='Количество повторов замера, берется лучший'
+        )
+        parser.add_argument(
+            '--min-speedup', type=float, default=0,
+            help='Минимально допустимое ускорение быстрого сериализатора'
+        )
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            if options['generate'] > 0:
+                self.generate(options['generate'])
+            self.benchmark(options)
+            transaction.set_rollback(True)
+
+    def benchmark(self, options):
+        page_size = max(options['page_size'], 1)
+        titles = Title.objects.order_by('id')
+
+        def regular():
+            return TitleReadSerializer(
+                titles.with_relations()[:page_size], many=True
+            ).data
+
+        def fast():
+            return TitleFastReadSerializer(
+                titles.values(*TitleRecord.VALUES)[:page_size], many=True
+            ).data
+
+        expected = regular()
+        if not expected:
+            raise CommandError(
+                'Нет произведений для замера: укажите --generate.'
+            )
+        if json.dumps(fast()) != json.dumps(expected):
+            raise CommandError(
+                'Вывод TitleFastReadSerializer отличается '
+                'от TitleReadSerializer.'
+            )
+        repeat = max(options['repeat'], 1)
+        regular_time = min(timeit.repeat(regular, number=1, repeat=repeat))
+        fast_time = min(timeit.repeat(fast, number=1, repeat=repeat))
+        speedup = regular_time / fast_time
+        self.stdout.write(
+            f'Произведений на странице: {len(expected)}\n'
+            f'TitleReadSerializer: {regular_time * 1000:.2f} мс\n'
+            f'TitleFastReadSerializer: {fast_time * 1000:.2f} мс'
+        )
+        if speedup < options['min_speedup']:
+            raise CommandError(
+                f'Ускорение {speedup:.2f} меньше '
+                f'{options["min_speedup"]:.2f}.'
+            )
+        self.stdout.write(self.style.SUCCESS(f'Ускорение: {speedup:.2f}x'))
+
+    @staticmethod
+    def generate(count):
+        category = Category.objects.create(
+            name='Категория замера', slug='benchmark-category'
+        )
+        # bulk_create на SQLite не заполняет pk, поэтому id выбираются
+        # отдельно.
+        Genre.objects.bulk_create(
+            Genre(name=f'Жанр замера {idx}', slug=f'benchmark-genre-{idx}')
+            for idx in range(GENRES_PER_TITLE)
+        )
+        Title.objects.bulk_create(
+            Title(
+                name=f'Произведение замера {idx}',
+                year=2000,
+                description='Описание произведения для замера',
+                category=category,
+            )
+            for idx in range(count)
+        )
+        genre_ids = Genre.objects.filter(
+            slug__startswith='benchmark-genre-'
+        ).values_list('pk', flat=True)
+        Title.genre.through.objects.bulk_create(
+            Title.genre.through(title_id=title_id, genre_id=genre_id)
+            for title_id in Title.objects.filter(
+                category=category
+            ).values_list('pk', flat=True)
+            for genre_id in genre_ids
+        )
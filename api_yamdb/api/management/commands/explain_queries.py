@@ -0,0 +1,176 @@
+import re
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection, transaction
+from django.test.utils import CaptureQueriesContext
+from rest_framework import status
+from rest_framework.test import APIClient
+
+from api import cache as response_cache
+from reviews import leaderboards
+from reviews.models import Category, Comment, Genre, Review, Title
+
+User = get_user_model()
+
+# Таблицы, которые растут вместе с каталогом: их полный просмотр
+# на каждый запрос недопустим.
+LARGE_TABLES = {
+    Title._meta.db_table,
+    Title.genre.through._meta.db_table,
+    Review._meta.db_table,
+    Comment._meta.db_table,
+}
+# Просмотр таблицы целиком, в том числе в порядке индекса:
+# SCAN t, SCAN t USING INDEX i, SCAN t USING COVERING INDEX i.
+FULL_SCAN = re.compile(r'^SCAN (\w+)(?: USING (?:COVERING )?INDEX \w+)?$')
+
+
+class Command(BaseCommand):
+    help = (
+        'Проверка планов запросов: выполняет GET-запросы к эндпоинтам '
+        'каталога, для каждого SQL-запроса получает EXPLAIN QUERY PLAN '
+        'и завершается ошибкой, если большая таблица читается целиком.'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--verbose-plans', action='store_true',
+            help='Показать планы всех запросов'
+        )
+
+    def handle(self, *args, **options):
+        if connection.vendor != 'sqlite':
+            raise CommandError('EXPLAIN QUERY PLAN есть только в SQLite.')
+        with transaction.atomic():
+            urls = self.create_sample()
+            problems = self.check_urls(urls, options['verbose_plans'])
+            transaction.set_rollback(True)
+        if problems:
+            raise CommandError(
+                f'Полный просмотр больших таблиц в {problems} запросах.'
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проверено эндпоинтов: {len(urls)}, полных просмотров нет.'
+        ))
+
+    @staticmethod
+    def create_sample():
+        """
+        Создает по одному объекту каждой модели на время проверки
+        и возвращает адреса запросов, которые выполняет клиент.
+        """
+        prefix = f'explain-{uuid.uuid4().hex[:8]}'
+        category = Category.objects.create(name=prefix, slug=prefix)
+        genre = Genre.objects.create(name=prefix, slug=prefix)
+        title = Title.objects.create(
+            name=prefix, year=2000, category=category
+        )
+        title.genre.add(genre)
+        author = User.objects.create_user(
+            username=prefix, email=f'{prefix}@yamdb.fake'
+        )
+        review = Review.objects.create(
+            title=title, author=author, text=prefix, score=5
+        )
+        Comment.objects.create(review=review, author=author, text=prefix)
+        titles = '/api/v1/titles/'
+        reviews = f'{titles}{title.pk}/reviews/'
+        comments = f'{reviews}{review.pk}/comments/'
+        return (
+            titles,
+            f'{titles}?genre={genre.slug}',
+            f'{titles}?genre={genre.slug},drama&genre_mode=all',
+            f'{titles}?category={category.slug}',
+            f'{titles}?year=2000',
+            f'{titles}?year_min=1990',
+            f'{titles}?year_max=2010',
+            f'{titles}?year_min=1990&year_max=2010',
+            f'{titles}?category={category.slug}&year=2000',
+            f'{titles}?name={prefix[-5:]}',
+            f'{titles}?ordering=-rating',
+            f'{titles}?ordering=-weighted_rating',
+            f'{titles}?ordering=year',
+            f'{titles}?ordering=-name',
+            f'{titles}?search={prefix}',
+            f'{titles}?pagination=cursor',
+            f'{titles}?fields=id,name,rating',
+            f'{titles}facets/?category={category.slug}',
+            f'{titles}batch/?ids={title.pk},{title.pk + 1}',
+            f'{titles}{title.pk}/',
+            f'{titles}{title.pk}/?expand=reviews,rating_distribution',
+            f'{titles}{title.pk}/rating-distribution/',
+            reviews,
+            f'{reviews}{review.pk}/',
+            f'{reviews}?fields=id,score&pagination=cursor',
+            comments,
+            f'{comments}?pagination=cursor',
+            '/api/v1/genres/',
+            '/api/v1/categories/',
+            f'/api/v1/genres/{genre.slug}/top/',
+            f'/api/v1/categories/{category.slug}/top/',
+        )
+
+    def check_urls(self, urls, verbose):
+        """
+        Количества произведений кэшируются до изменения каталога и на
+        каждый запрос не считаются. Поэтому адреса запрашиваются дважды:
+        первый проход заполняет кэш количеств, перед вторым сбрасываются
+        остальные кэши, и проверяются запросы второго прохода.
+        """
+        client = APIClient()
+        for url in urls:
+            self.get(client, url)
+        response_cache.invalidate((
+            response_cache.CATALOGUE_VERSION_KEY,
+            response_cache.TITLES_VERSION_KEY,
+        ))
+        leaderboards.invalidate_all()
+        problems = 0
+        for url in urls:
+            with CaptureQueriesContext(connection) as context:
+                self.get(client, url)
+            for query in context.captured_queries:
+                plan = self.explain(query['sql'])
+                scans = self.full_scans(query['sql'], plan)
+                problems += bool(scans)
+                if scans:
+                    self.stdout.write(self.style.ERROR(
+                        f'{url}: полный просмотр {", ".join(scans)}\n'
+                        f'  {query["sql"]}\n  ' + '\n  '.join(plan)
+                    ))
+                elif verbose:
+                    self.stdout.write(
+                        f'{url}\n  {query["sql"]}\n  ' + '\n  '.join(plan)
+                    )
+        return problems
+
+    @staticmethod
+    def get(client, url):
+        response = client.get(url)
+        if response.status_code != status.HTTP_200_OK:
+            raise CommandError(f'{url}: статус ответа {response.status_code}.')
+
+    @staticmethod
+    def explain(sql):
+        with connection.cursor() as cursor:
+            cursor.execute(f'EXPLAIN QUERY PLAN {sql}')
+            return [row[-1] for row in cursor.fetchall()]
+
+    @staticmethod
+    def full_scans(sql, plan):
+        """
+        Большие таблицы, которые план читает целиком. Просмотр
+        без условий по первичному ключу с LIMIT останавливается
+        на первой странице и полным не считается.
+        """
+        sorted_in_memory = any('TEMP B-TREE' in step for step in plan)
+        stops_early = (
+            ' LIMIT ' in sql and ' WHERE ' not in sql
+            and not sorted_in_memory
+        )
+        return [
+            match[1] for match in map(FULL_SCAN.match, plan)
+            if match and match[1] in LARGE_TABLES and not stops_early
+        ]
@@ -0,0 +1,189 @@
+import threading
+import time
+import uuid
+
+from django.contrib.auth import get_user_model
+from django.core.management.base import BaseCommand, CommandError
+from django.db import OperationalError, connection
+from django.db.models import Count, Sum
+from rest_framework import status
+from rest_framework.test import APIRequestFactory, force_authenticate
+
+from api.views import ReviewViewSet, TitleViewSet
+from reviews.models import Title
+
+User = get_user_model()
+
+LOCK_RETRIES = 50
+LOCK_BACKOFF = 0.005
+# Нижняя граница пропускной способности: на SQLite в тестах команда
+# создает около 180 отзывов в секунду, запас оставлен для медленных машин.
+MIN_THROUGHPUT = 20.0
+
+
+class Command(BaseCommand):
+    help = (
+        'Нагрузочная проверка рейтинга: параллельные потоки создают отзывы '
+        'на одно произведение, пока администратор правит его описание.'
+    )
+
+    factory = APIRequestFactory()
+    create_review = staticmethod(ReviewViewSet.as_view({'post': 'create'}))
+    update_title = staticmethod(
+        TitleViewSet.as_view({'patch': 'partial_update'})
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--writers', type=int, default=8,
+            help='Количество потоков, создающих отзывы'
+        )
+        parser.add_argument(
+            '--reviews', type=int, default=200,
+            help='Общее количество создаваемых отзывов'
+        )
+        parser.add_argument(
+            '--min-throughput', type=float, default=MIN_THROUGHPUT,
+            help=(
+                'Минимально допустимое число отзывов в секунду, '
+                '0 — без проверки'
+            )
+        )
+
+    def handle(self, *args, **options):
+        writers = max(options['writers'], 1)
+        prefix = f'stress-{uuid.uuid4().hex[:8]}'
+        self.admin = User.objects.create_user(
+            username=f'{prefix}-admin',
+            email=f'{prefix}-admin@yamdb.fake',
+            role='admin'
+        )
+        User.objects.bulk_create(
+            User(
+                username=f'{prefix}-{idx}', email=f'{prefix}-{idx}@yamdb.fake'
+            )
+            for idx in range(max(options['reviews'], 1))
+        )
+        authors = User.objects.filter(
+            username__startswith=prefix
+        ).exclude(pk=self.admin.pk)
+        self.title = Title.objects.create(name=prefix, year=2000)
+        self.created = []
+        self.errors = []
+        try:
+            elapsed = self.run_writers(list(enumerate(authors)), writers)
+            self.check_rating()
+        finally:
+            self.title.delete()
+            User.objects.filter(username__startswith=prefix).delete()
+
+        throughput = len(self.created) / elapsed if elapsed else float('inf')
+        self.stdout.write(
+            f'Создано отзывов: {len(self.created)} за {elapsed:.2f} с '
+            f'({throughput:.1f} отзывов/с, потоков: {writers}).'
+        )
+        if throughput < options['min_throughput']:
+            raise CommandError(
+                f'Пропускная способность {throughput:.1f} отзывов/с ниже '
+                f'порога {options["min_throughput"]}.'
+            )
+        self.stdout.write(self.style.SUCCESS('Рейтинг согласован.'))
+
+    def run_writers(self, numbered_authors, writers):
+        """
+        Запускает потоки с отзывами и параллельный поток правок
+        произведения, возвращает время работы потоков с отзывами.
+        """
+        threads = [
+            self.in_thread(self.write_reviews, numbered_authors[idx::writers])
+            for idx in range(writers)
+        ]
+        done = threading.Event()
+        patcher = self.in_thread(self.patch_title, done)
+        started = time.perf_counter()
+        patcher.start()
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        elapsed = time.perf_counter() - started
+        done.set()
+        patcher.join()
+        if self.errors:
+            raise CommandError(f'Ошибки при записи: {self.errors[:3]}')
+        return elapsed
+
+    def in_thread(self, target, *args):
+        """Оборачивает цель в поток со своим соединением с БД."""
+        def run():
+            try:
+                target(*args)
+            except Exception as error:
+                self.errors.append(error)
+            finally:
+                connection.close()
+        return threading.Thread(target=run)
+
+    def write_reviews(self, numbered_authors):
+        for idx, author in numbered_authors:
+            score = idx % 10 + 1
+            response = self.call_with_retries(
+                self.create_review,
+                lambda: self.make_request(
+                    'post', author, {'text': f'Отзыв {idx}', 'score': score}
+                ),
+                title_id=self.title.pk
+            )
+            if response.status_code == status.HTTP_201_CREATED:
+                self.created.append(score)
+            else:
+                self.errors.append(response.data)
+
+    def patch_title(self, done):
+        step = 0
+        while not done.is_set():
+            step += 1
+            self.call_with_retries(
+                self.update_title,
+                lambda: self.make_request(
+                    'patch', self.admin, {'description': f'Правка {step}'}
+                ),
+                pk=self.title.pk
+            )
+
+    def make_request(self, method, user, data):
+        request = getattr(self.factory, method)('/', data, format='json')
+        force_authenticate(request, user=user)
+        return request
+
+    @staticmethod
+    def call_with_retries(view, make_request, **kwargs):
+        """Повторяет запрос, если SQLite занят другой транзакцией."""
+        for attempt in range(LOCK_RETRIES):
+            try:
+                return view(make_request(), **kwargs)
+            except OperationalError as error:
+                if 'locked' not in str(error):
+                    raise
+                time.sleep(LOCK_BACKOFF * (attempt + 1))
+        return view(make_request(), **kwargs)
+
+    def check_rating(self):
+        """Сверяет счетчики произведения с отзывами и успешными запросами."""
+        self.title.refresh_from_db()
+        stats = self.title.reviews.aggregate(
+            total=Sum('score'), count=Count('id')
+        )
+        total, count = sum(self.created), len(self.created)
+        expected = (total, count, total // count if count else None)
+        actual = (
+            self.title.score_sum, self.title.review_count, self.title.rating
+        )
+        if actual != expected or (
+            stats['total'] or 0, stats['count']
+        ) != expected[:2]:
+            raise CommandError(
+                f'Рейтинг рассогласован: ожидалось {expected}, '
+                f'в произведении {actual}, в отзывах '
+                f'{(stats["total"], stats["count"])}.'
+            )
@@ -0,0 +1,256 @@
+import hashlib
+
+from django.core.cache import cache
+from django.shortcuts import get_object_or_404
+from django.utils.cache import get_conditional_response
+from django.utils.http import http_date, quote_etag
+from rest_framework import status
+from rest_framework.decorators import action
+from rest_framework.exceptions import ValidationError
+from rest_framework.permissions import SAFE_METHODS
+from rest_framework.response import Response
+
+from api import cache as response_cache
+from api.pagination import get_limit
+from api.serializers import (
+    ReviewSerializer,
+    ScoreDistributionSerializer,
+    TitleReadSerializer,
+)
+from reviews import leaderboards
+from reviews.constants import EXPANDED_REVIEWS_SIZE, LEADERBOARD_SIZE
+from reviews.models import Review, ScoreDistribution, Title
+
+
+class TopTitlesMixin:
+    """
+    Добавляет эндпоинт {slug}/top/ с лучшими по рейтингу
+    произведениями жанра или категории из кэшированного рейтинг-листа.
+    """
+    leaderboard_kind = None
+
+    @action(detail=True, methods=('get',))
+    def top(self, request, slug=None):
+        group = get_object_or_404(self.queryset.only('pk'), slug=slug)
+        title_ids = leaderboards.top_title_ids(
+            self.leaderboard_kind, group.pk, self.get_top_limit()
+        )
+        titles = Title.objects.with_relations().in_bulk(title_ids)
+        serializer = TitleReadSerializer(
+            [titles[pk] for pk in title_ids if pk in titles],
+            many=True,
+            context=self.get_serializer_context()
+        )
+        return Response(serializer.data)
+
+    def get_top_limit(self):
+        return get_limit(self.request, LEADERBOARD_SIZE)
+
+
+class TitleResponseCacheMixin:
+    """
+    Отдает список и карточки произведений из кэша. Ключ включает
+    версии из api.cache, которые меняются при изменении произведения,
+    его жанров, категории или рейтинга, поэтому устаревший ответ
+    не выдается и удалять его не нужно. Версии карточки берутся
+    из get_version_keys вьюсета.
+    """
+    response_cache_timeout = response_cache.RESPONSE_CACHE_TIMEOUT
+
+    def list(self, request, *args, **kwargs):
+        return self.cached_response(
+            response_cache.title_list_key(request),
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.cached_response(
+            response_cache.title_detail_key(
+                kwargs[self.lookup_url_kwarg or self.lookup_field], request,
+                self.get_version_keys()
+            ),
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def cached_response(self, key, handler, request, *args, **kwargs):
+        """
+        Ключ вычисляется до чтения из БД: если данные изменятся
+        во время сборки ответа, он попадет под уже устаревшую версию.
+        """
+        data = cache.get(key)
+        if data is not None:
+            return Response(data)
+        response = handler(request, *args, **kwargs)
+        if response.status_code == status.HTTP_200_OK:
+            cache.set(key, response.data, self.response_cache_timeout)
+        return response
+
+
+class ConditionalGetMixin:
+    """
+    Условные GET-запросы для list и retrieve. ETag и Last-Modified
+    строятся из версий api.cache, перечисленных в get_version_keys,
+    поэтому ответ 304 отдается без запросов к БД и сериализации.
+    """
+
+    def get_version_keys(self):
+        """Ключи версий, от которых зависит ответ текущего действия."""
+        raise NotImplementedError
+
+    def list(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().list, request, *args, **kwargs
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        return self.conditional_response(
+            super().retrieve, request, *args, **kwargs
+        )
+
+    def conditional_response(self, handler, request, *args, **kwargs):
+        versions = response_cache.get_versions(*self.get_version_keys())
+        etag = quote_etag(hashlib.md5(':'.join(
+            (request.accepted_renderer.format, *map(str, versions))
+        ).encode()).hexdigest())
+        # Версии — время изменения в наносекундах. Точность
+        # Last-Modified — секунда, точный валидатор — ETag.
+        last_modified = max(versions) // 10 ** 9
+        response = get_conditional_response(
+            request, etag=etag, last_modified=last_modified
+        )
+        if response is None:
+            response = handler(request, *args, **kwargs)
+            if response.status_code != status.HTTP_200_OK:
+                return response
+        response['ETag'] = etag
+        response['Last-Modified'] = http_date(last_modified)
+        return response
+
+
+class SparseFieldsetMixin:
+    """
+    Частичные ответы list и retrieve: ?fields=id,name оставляет
+    только перечисленные поля, ?omit=description убирает указанные.
+    Сериализатор получает список полей в context['fields'],
+    из БД читаются только нужные колонки.
+    """
+    sparse_actions = ('list', 'retrieve')
+    # Колонки для полей ответа, которые не совпадают с полями модели.
+    # Для связей из select_related нужен и сам внешний ключ.
+    sparse_columns = {}
+
+    def has_sparse_params(self):
+        params = self.request.query_params
+        return (
+            self.action in self.sparse_actions
+            and self.request.method in SAFE_METHODS
+            and ('fields' in params or 'omit' in params)
+        )
+
+    def get_sparse_fields(self):
+        """Поля ответа по порядку сериализатора или None для полного."""
+        if not hasattr(self, '_sparse_fields'):
+            self._sparse_fields = None
+            if self.has_sparse_params():
+                self._sparse_fields = self.parse_sparse_fields()
+        return self._sparse_fields
+
+    def parse_sparse_fields(self):
+        params = self.request.query_params
+        available = self.get_serializer_class().Meta.fields
+        requested = set(available)
+        if 'fields' in params:
+            requested = set(filter(None, params['fields'].split(',')))
+        omitted = set(filter(None, params.get('omit', '').split(',')))
+        unknown = (requested | omitted) - set(available)
+        if unknown:
+            raise ValidationError({
+                'fields': f'Неизвестные поля: {", ".join(sorted(unknown))}.'
+            })
+        return [
+            name for name in available
+            if name in requested and name not in omitted
+        ]
+
+    def requests_field(self, name):
+        fields = self.get_sparse_fields()
+        return fields is None or name in fields
+
+    def defer_unused_columns(self, queryset):
+        """
+        Ограничивает SELECT колонками выбранных полей. Поля сортировки
+        курсора читаются всегда: по ним строится ссылка на страницу.
+        """
+        fields = self.get_sparse_fields()
+        if fields is None:
+            return queryset
+        model_fields = {
+            field.name for field in queryset.model._meta.concrete_fields
+        }
+        columns = {'id'}
+        for name in fields:
+            columns.update(self.sparse_columns.get(
+                name, (name,) if name in model_fields else ()
+            ))
+        columns.update(
+            name.lstrip('-') for name in getattr(self, 'cursor_ordering', ())
+        )
+        return queryset.only(*columns)
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context['fields'] = self.get_sparse_fields()
+        return context
+
+
+class TitleExpandMixin:
+    """
+    ?expand=reviews,rating_distribution в карточке произведения:
+    последние отзывы с авторами и распределение оценок встраиваются
+    в ответ, по одному запросу на каждое.
+    """
+    expansions = ('reviews', 'rating_distribution')
+
+    def get_expand(self):
+        """Запрошенные встраивания по порядку expansions."""
+        if self.action != 'retrieve':
+            return []
+        expand = set(filter(
+            None, self.request.query_params.get('expand', '').split(',')
+        ))
+        unknown = expand - set(self.expansions)
+        if unknown:
+            raise ValidationError({'expand': (
+                f'Неизвестные значения: {", ".join(sorted(unknown))}.'
+            )})
+        return [name for name in self.expansions if name in expand]
+
+    def get_expand_version_keys(self, title_id):
+        """Отзывы и гистограмма меняются вместе с отзывами произведения."""
+        if not self.get_expand():
+            return ()
+        return (
+            response_cache.reviews_version_key(title_id),
+            response_cache.USERS_VERSION_KEY,
+        )
+
+    def retrieve(self, request, *args, **kwargs):
+        response = super().retrieve(request, *args, **kwargs)
+        title_id = kwargs[self.lookup_url_kwarg or self.lookup_field]
+        expand = self.get_expand()
+        if 'reviews' in expand:
+            response.data['reviews'] = ReviewSerializer(
+                Review.objects.filter(title_id=title_id).select_related(
+                    'author'
+                ).order_by('-pub_date', '-id')[:EXPANDED_REVIEWS_SIZE],
+                many=True,
+                context={'request': request, 'view': self}
+            ).data
+        if 'rating_distribution' in expand:
+            distribution = ScoreDistribution.objects.filter(
+                title_id=title_id
+            ).first() or ScoreDistribution(title_id=title_id)
+            response.data['rating_distribution'] = (
+                ScoreDistributionSerializer(distribution).data
+            )
+        return response
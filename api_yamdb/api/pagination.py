@@ -0,0 +1,257 @@
+import hashlib
+import threading
+import time
+from functools import partial
+
+from django.core.cache import cache
+from django.core.exceptions import EmptyResultSet
+from django.core.paginator import EmptyPage, InvalidPage, Page, Paginator
+from django.db import connection
+from django.utils.functional import cached_property
+from rest_framework.exceptions import NotFound
+from rest_framework.pagination import CursorPagination, PageNumberPagination
+from rest_framework.response import Response
+
+from api.cache import get_versions
+
+# Через сколько секунд закэшированное количество объектов
+# пересчитывается в фоне и сколько его можно отдавать устаревшим.
+COUNT_REFRESH_AFTER = 60
+COUNT_CACHE_TIMEOUT = 60 * 60
+
+
+def get_limit(request, maximum):
+    """Размер выдачи из ?limit=, не больше maximum."""
+    try:
+        limit = int(request.query_params.get('limit', 0))
+    except ValueError:
+        limit = 0
+    if limit <= 0:
+        return maximum
+    return min(limit, maximum)
+
+
+def _refresh_count(key, queryset):
+    try:
+        cache.set(
+            key,
+            (queryset.count(), time.time() + COUNT_REFRESH_AFTER),
+            COUNT_CACHE_TIMEOUT
+        )
+    finally:
+        cache.delete(f'{key}:lock')
+        connection.close()
+
+
+def _count_key(queryset, prefix='count'):
+    """Ключ по SQL выборки или None, если она заведомо пуста."""
+    try:
+        sql = str(queryset.query)
+    except EmptyResultSet:
+        # Например, queryset.none().
+        return None
+    return f'{prefix}:' + hashlib.md5(sql.encode()).hexdigest()
+
+
+def versioned_count(queryset, version_key):
+    """
+    Точное количество объектов выборки из кэша. Версия по ключу
+    version_key меняется при любом изменении, от которого зависит
+    количество, и читается до COUNT(*): результат, посчитанный
+    до такого изменения, останется под старой версией.
+    """
+    version, = get_versions(version_key)
+    key = _count_key(queryset, f'count:{version}')
+    if key is None:
+        return 0
+    count = cache.get(key)
+    if count is None:
+        count = queryset.count()
+        cache.set(key, count, COUNT_CACHE_TIMEOUT)
+    return count
+
+
+def cached_count(queryset):
+    """
+    Количество объектов выборки из кэша. Устаревшее значение
+    отдается сразу, а пересчитывается в фоновом потоке;
+    COUNT(*) в запросе выполняется только при пустом кэше.
+    """
+    key = _count_key(queryset)
+    if key is None:
+        return 0
+    entry = cache.get(key)
+    if entry is None:
+        count = queryset.count()
+        cache.set(
+            key, (count, time.time() + COUNT_REFRESH_AFTER),
+            COUNT_CACHE_TIMEOUT
+        )
+        return count
+    count, refresh_at = entry
+    if time.time() >= refresh_at and cache.add(
+        f'{key}:lock', True, COUNT_REFRESH_AFTER
+    ):
+        threading.Thread(
+            target=_refresh_count, args=(key, queryset.all()), daemon=True
+        ).start()
+    return count
+
+
+class CachedCountPaginator(Paginator):
+    """Paginator, берущий количество объектов из кэша."""
+
+    @cached_property
+    def count(self):
+        return cached_count(self.object_list)
+
+
+class VersionedCountPaginator(Paginator):
+    """Paginator с точным количеством объектов из кэша по версии."""
+
+    def __init__(self, *args, version_key, **kwargs):
+        super().__init__(*args, **kwargs)
+        self.version_key = version_key
+
+    @cached_property
+    def count(self):
+        return versioned_count(self.object_list, self.version_key)
+
+
+class CountlessPage(Page):
+
+    def __init__(self, object_list, number, paginator, has_next):
+        super().__init__(object_list, number, paginator)
+        self._has_next = has_next
+
+    def has_next(self):
+        return self._has_next
+
+
+class CountlessPaginator(Paginator):
+    """
+    Paginator без COUNT(*): выбирает на одну запись больше страницы,
+    чтобы узнать, есть ли следующая.
+    """
+
+    def validate_number(self, number):
+        try:
+            number = int(number)
+        except (TypeError, ValueError):
+            raise InvalidPage('Номер страницы должен быть целым числом.')
+        if number < 1:
+            raise EmptyPage('Номер страницы меньше 1.')
+        return number
+
+    def page(self, number):
+        number = self.validate_number(number)
+        bottom = (number - 1) * self.per_page
+        objects = list(self.object_list[bottom:bottom + self.per_page + 1])
+        if not objects and number > 1:
+            raise EmptyPage('На этой странице нет результатов.')
+        return CountlessPage(
+            objects[:self.per_page], number, self,
+            has_next=len(objects) > self.per_page
+        )
+
+
+class KeysetPagination(CursorPagination):
+    """
+    Пагинация по ключу сортировки: страница выбирается условием
+    по индексированным полям, без COUNT(*) и OFFSET.
+    Сортировка всегда берется из cursor_ordering вьюсета, а не из
+    ?ordering=, потому что курсор по nullable-полю вроде rating
+    не может указать на позицию.
+    """
+
+    def get_ordering(self, request, queryset, view):
+        return self.ordering
+
+
+class OptionalCursorPagination(PageNumberPagination):
+    """
+    Пагинация по номеру страницы, которая по запросу клиента
+    переключается на пагинацию по ключу.
+
+    Режим курсора включается параметром ?pagination=cursor или
+    наличием ?cursor= и доступен вьюсетам с атрибутом cursor_ordering:
+    стабильной сортировкой, опирающейся на индекс.
+
+    Поле count по умолчанию точное. Атрибут вьюсета count_mode или
+    параметр ?count= переключают его: false убирает count и COUNT(*),
+    estimated отдает количество из кэша с обновлением в фоне.
+    Точное количество берется из кэша, если у вьюсета есть атрибут
+    count_version_key: ключ версии, которая меняется при изменениях,
+    влияющих на количество.
+    """
+    mode_query_param = 'pagination'
+    cursor_mode = 'cursor'
+    count_query_param = 'count'
+    COUNT_EXACT = 'exact'
+    COUNT_ESTIMATED = 'estimated'
+    COUNT_NONE = 'false'
+    count_modes = (COUNT_EXACT, COUNT_ESTIMATED, COUNT_NONE)
+    count_mode = COUNT_EXACT
+    keyset = None
+
+    def paginate_queryset(self, queryset, request, view=None):
+        self.keyset = self.get_keyset_paginator(request, view)
+        if self.keyset is not None:
+            return self.keyset.paginate_queryset(queryset, request, view)
+        self.count_mode = self.get_count_mode(request, view)
+        if self.count_mode == self.COUNT_NONE:
+            return self.paginate_without_count(queryset, request)
+        if self.count_mode == self.COUNT_ESTIMATED:
+            self.django_paginator_class = CachedCountPaginator
+        elif getattr(view, 'count_version_key', None):
+            self.django_paginator_class = partial(
+                VersionedCountPaginator, version_key=view.count_version_key
+            )
+        return super().paginate_queryset(queryset, request, view)
+
+    def get_paginated_response(self, data):
+        if self.keyset is not None:
+            return self.keyset.get_paginated_response(data)
+        if self.count_mode == self.COUNT_NONE:
+            return Response({
+                'next': self.get_next_link(),
+                'previous': self.get_previous_link(),
+                'results': data,
+            })
+        return super().get_paginated_response(data)
+
+    def get_count_mode(self, request, view):
+        mode = request.query_params.get(self.count_query_param)
+        if mode in self.count_modes:
+            return mode
+        return getattr(view, 'count_mode', self.COUNT_EXACT)
+
+    def paginate_without_count(self, queryset, request):
+        page_size = self.get_page_size(request)
+        if not page_size:
+            return None
+        paginator = CountlessPaginator(queryset, page_size)
+        page_number = request.query_params.get(self.page_query_param, 1)
+        try:
+            self.page = paginator.page(page_number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(
+                page_number=page_number, message=str(exc)
+            ))
+        self.request = request
+        return list(self.page)
+
+    def get_keyset_paginator(self, request, view):
+        ordering = getattr(view, 'cursor_ordering', None)
+        if not ordering:
+            return None
+        params = request.query_params
+        if (
+            params.get(self.mode_query_param) != self.cursor_mode
+            and KeysetPagination.cursor_query_param not in params
+        ):
+            return None
+        keyset = KeysetPagination()
+        keyset.ordering = ordering
+        keyset.page_size = self.page_size
+        return keyset
@@ -1,8 +1,25 @@
 from datetime import datetime
 
+from django.db import transaction
+from django.utils.encoding import smart_str
 from rest_framework import serializers
+from rest_framework.utils import html
 
-from reviews.models import Category, Comment, Genre, Review, Title
+from reviews.constants import (
+    BULK_TITLES_MAX_SIZE,
+    DEFAULT_CATEGORY_NAME,
+    DEFAULT_CATEGORY_SLUG,
+)
+from reviews.models import (
+    Category,
+    Comment,
+    Genre,
+    Review,
+    ScoreDistribution,
+    Title,
+    titles_bulk_changed,
+)
+from reviews.search import normalize_text
 
 
 class GenreSerializer(serializers.ModelSerializer):
@@ -17,7 +34,19 @@ class CategorySerializer(serializers.ModelSerializer):
         fields = ('name', 'slug')
 
 
-class TitleReadSerializer(serializers.ModelSerializer):
+class SparseFieldsSerializerMixin:
+    """Оставляет только поля из context['fields'], если он задан."""
+
+    def __init__(self, *args, **kwargs):
+        super().__init__(*args, **kwargs)
+        fields = self.context.get('fields')
+        if fields is not None:
+            for name in set(self.fields) - set(fields):
+                self.fields.pop(name)
+
+
+class TitleReadSerializer(SparseFieldsSerializerMixin,
+                          serializers.ModelSerializer):
     genre = GenreSerializer(many=True, read_only=True)
     category = CategorySerializer(read_only=True)
 
@@ -29,13 +58,240 @@ class TitleReadSerializer(serializers.ModelSerializer):
         )
 
 
+class GroupRecord:
+    """Жанр или категория произведения для быстрого чтения."""
+    __slots__ = ('name', 'slug')
+
+    def __init__(self, name, slug):
+        self.name = name
+        self.slug = slug
+
+    def to_dict(self):
+        return {'name': self.name, 'slug': self.slug}
+
+
+class TitleRecord:
+    """
+    Произведение для быстрого чтения: строка values() без создания
+    моделей. to_dict повторяет вывод TitleReadSerializer.
+    """
+    __slots__ = (
+        'id', 'name', 'year', 'rating', 'description', 'genre', 'category'
+    )
+    VALUES = (
+        'id', 'name', 'year', 'rating', 'description',
+        'category__name', 'category__slug'
+    )
+
+    def __init__(self, row):
+        self.id = row['id']
+        self.name = row['name']
+        self.year = row['year']
+        self.rating = row['rating']
+        self.description = row['description']
+        self.category = None
+        if row['category__slug'] is not None:
+            self.category = GroupRecord(
+                row['category__name'], row['category__slug']
+            )
+        self.genre = []
+
+    @classmethod
+    def from_rows(cls, rows):
+        """Собирает записи, подгружая жанры всех строк одним запросом."""
+        records = [cls(row) for row in rows]
+        by_id = {record.id: record for record in records}
+        for title_id, name, slug in Title.genre.through.objects.filter(
+            title_id__in=by_id
+        ).order_by('genre_id').values_list(
+            'title_id', 'genre__name', 'genre__slug'
+        ):
+            by_id[title_id].genre.append(GroupRecord(name, slug))
+        return records
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'name': self.name,
+            'year': self.year,
+            'rating': self.rating,
+            'description': self.description,
+            'genre': [genre.to_dict() for genre in self.genre],
+            'category': self.category and self.category.to_dict(),
+        }
+
+
+class TitleFastListSerializer(serializers.ListSerializer):
+
+    def to_representation(self, data):
+        return [record.to_dict() for record in TitleRecord.from_rows(data)]
+
+
+class TitleFastReadSerializer(serializers.BaseSerializer):
+    """
+    Сериализатор только для чтения без полей DRF. Принимает строки
+    queryset.values(*TitleRecord.VALUES) и отдает тот же JSON,
+    что и TitleReadSerializer.
+    """
+
+    class Meta:
+        list_serializer_class = TitleFastListSerializer
+
+    def to_representation(self, instance):
+        record, = TitleRecord.from_rows((instance,))
+        return record.to_dict()
+
+
+class ScoreDistributionSerializer(serializers.ModelSerializer):
+    review_count = serializers.SerializerMethodField()
+    distribution = serializers.SerializerMethodField()
+
+    class Meta:
+        model = ScoreDistribution
+        fields = ('review_count', 'distribution')
+
+    def get_review_count(self, obj):
+        return sum(count for _, count in obj.counts())
+
+    def get_distribution(self, obj):
+        return [
+            {'score': score, 'count': count}
+            for score, count in obj.counts()
+        ]
+
+
+class CachedSlugRelatedField(serializers.SlugRelatedField):
+    """
+    SlugRelatedField без запроса на каждое значение. При первом
+    обращении все slug этого поля из данных запроса, в том числе
+    из всех элементов списка при many=True, загружаются одним
+    IN-запросом. Найденные объекты хранятся в корневом сериализаторе
+    и живут, пока обрабатывается запрос.
+    """
+
+    def get_cache(self):
+        cache = self.root.__dict__.setdefault('_slug_cache', {})
+        return cache.setdefault(
+            (self.get_queryset().model, self.slug_field), {}
+        )
+
+    def payload_slugs(self):
+        """Все значения поля в исходных данных корневого сериализатора."""
+        if isinstance(self.parent, serializers.ManyRelatedField):
+            name = self.parent.field_name
+        else:
+            name = self.field_name
+        data = getattr(self.root, 'initial_data', None)
+        slugs = set()
+        for item in data if isinstance(data, list) else (data,):
+            if html.is_html_input(item):
+                values = item.getlist(name)
+            elif isinstance(item, dict):
+                values = item.get(name)
+            else:
+                continue
+            if not isinstance(values, list):
+                values = (values,)
+            slugs.update(value for value in values if isinstance(value, str))
+        return slugs
+
+    def lookup(self, slug):
+        """Объект по slug или None, если его нет."""
+        cache = self.get_cache()
+        if slug not in cache:
+            slugs = ({slug} | self.payload_slugs()) - cache.keys()
+            found = {
+                getattr(obj, self.slug_field): obj
+                for obj in self.get_queryset().filter(
+                    **{f'{self.slug_field}__in': slugs}
+                )
+            }
+            cache.update((value, found.get(value)) for value in slugs)
+        return cache[slug]
+
+    def to_internal_value(self, data):
+        if not isinstance(data, str):
+            self.fail('invalid')
+        obj = self.lookup(data)
+        if obj is None:
+            self.fail(
+                'does_not_exist',
+                slug_name=self.slug_field,
+                value=smart_str(data)
+            )
+        return obj
+
+
+class TitleBulkSerializer(serializers.ListSerializer):
+    """
+    Массовое создание и изменение произведений одной транзакцией:
+    bulk_create или bulk_update и одна пачка вставок жанров.
+    save() и сигналы по каждому произведению не вызываются,
+    зависимые данные обновляет сигнал titles_bulk_changed.
+    """
+
+    def to_internal_value(self, data):
+        if isinstance(data, list) and len(data) > BULK_TITLES_MAX_SIZE:
+            raise serializers.ValidationError(
+                f'За один запрос можно передать не больше '
+                f'{BULK_TITLES_MAX_SIZE} произведений.'
+            )
+        return super().to_internal_value(data)
+
+    @transaction.atomic
+    def create(self, validated_data):
+        default_category = None
+        if any('category' not in attrs for attrs in validated_data):
+            default_category = self.child.get_default_category()
+        genres = [attrs.pop('genre') for attrs in validated_data]
+        titles = Title.objects.bulk_insert([
+            Title(**{'category': default_category, **attrs})
+            for attrs in validated_data
+        ])
+        Title.objects.bulk_add_genres({
+            title.pk: title_genres
+            for title, title_genres in zip(titles, genres)
+        })
+        titles_bulk_changed.send(
+            sender=Title, title_ids=[title.pk for title in titles]
+        )
+        return titles
+
+    @transaction.atomic
+    def update(self, instances, validated_data):
+        """
+        instances — произведения в порядке validated_data.
+        Обновляются только переданные поля, поля рейтинга не трогаются.
+        """
+        fields = set()
+        genres = {}
+        for title, attrs in zip(instances, validated_data):
+            if 'genre' in attrs:
+                genres[title.pk] = attrs.pop('genre')
+            for field, value in attrs.items():
+                setattr(title, field, value)
+            fields.update(attrs)
+            title.normalized_name = normalize_text(title.name)
+        if 'name' in fields:
+            fields.add('normalized_name')
+        if fields:
+            Title.objects.bulk_update(instances, fields)
+        if genres:
+            Title.genre.through.objects.filter(title_id__in=genres).delete()
+            Title.objects.bulk_add_genres(genres)
+        titles_bulk_changed.send(
+            sender=Title, title_ids=[title.pk for title in instances]
+        )
+        return instances
+
+
 class TitleCreateSerializer(serializers.ModelSerializer):
-    genre = serializers.SlugRelatedField(
+    genre = CachedSlugRelatedField(
         many=True,
         slug_field='slug',
         queryset=Genre.objects.all()
     )
-    category = serializers.SlugRelatedField(
+    category = CachedSlugRelatedField(
         slug_field='slug',
         queryset=Category.objects.all()
     )
@@ -46,17 +302,32 @@ class TitleCreateSerializer(serializers.ModelSerializer):
             'id', 'name', 'year', 'description',
             'genre', 'category'
         )
+        list_serializer_class = TitleBulkSerializer
+
+    def get_default_category(self):
+        """
+        Берем категорию «Без категории» из кэша slug запроса
+        и создаем ее, только если ее еще нет.
+        """
+        category_field = self.fields['category']
+        default_category = category_field.lookup(DEFAULT_CATEGORY_SLUG)
+        if default_category is None:
+            default_category, _ = Category.objects.get_or_create(
+                slug=DEFAULT_CATEGORY_SLUG,
+                defaults={'name': DEFAULT_CATEGORY_NAME}
+            )
+            category_field.get_cache()[DEFAULT_CATEGORY_SLUG] = (
+                default_category
+            )
+        return default_category
 
     def create(self, validated_data):
         """
-        Получаем или создаем категорию «Без категории»,
+        Подставляем категорию «Без категории»,
         если она не передана.
         """
         if 'category' not in validated_data:
-            default_category, _ = Category.objects.get_or_create(
-                name='Без категории', slug='no-category'
-            )
-            validated_data['category'] = default_category
+            validated_data['category'] = self.get_default_category()
 
         return super().create(validated_data)
 
@@ -88,7 +359,8 @@ class TitleCreateSerializer(serializers.ModelSerializer):
         return value
 
 
-class ReviewSerializer(serializers.ModelSerializer):
+class ReviewSerializer(SparseFieldsSerializerMixin,
+                       serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
 
     class Meta:
@@ -111,7 +383,8 @@ class ReviewSerializer(serializers.ModelSerializer):
         return data
 
 
-class CommentSerializer(serializers.ModelSerializer):
+class CommentSerializer(SparseFieldsSerializerMixin,
+                        serializers.ModelSerializer):
     author = serializers.StringRelatedField(read_only=True)
 
     class Meta:
@@ -0,0 +1,153 @@
+from django.contrib.auth import get_user_model
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete
+)
+from django.dispatch import receiver
+
+from api import cache as response_cache
+from reviews.models import (
+    Category, Comment, Genre, Review, Title, titles_bulk_changed,
+    titles_bulk_delete
+)
+from reviews.ratings import rating_changed
+from reviews.search import search_index_rebuilt
+
+User = get_user_model()
+
+
+@receiver((post_save, post_delete), sender=Title)
+def invalidate_title_on_change(sender, instance, **kwargs):
+    response_cache.invalidate_titles((instance.pk,))
+
+
+@receiver(titles_bulk_changed)
+def invalidate_bulk_changed_titles(sender, title_ids, **kwargs):
+    response_cache.invalidate_titles(title_ids)
+
+
+@receiver(titles_bulk_delete)
+def invalidate_bulk_deleted_titles(sender, title_ids, **kwargs):
+    """
+    Сбрасывает произведения, списки и обсуждения, которые уйдут
+    при массовом удалении, по одному разу на все произведения.
+    """
+    response_cache.invalidate_titles(title_ids)
+    response_cache.invalidate_discussions(
+        title_ids=title_ids,
+        review_ids=Review.objects.filter(title_id__in=title_ids).values_list(
+            'pk', flat=True
+        ),
+    )
+
+
+@receiver(rating_changed)
+def invalidate_titles_on_rating_change(sender, title_ids, **kwargs):
+    response_cache.invalidate_titles(title_ids, counts=False)
+
+
+@receiver(search_index_rebuilt)
+def invalidate_title_lists(sender, **kwargs):
+    response_cache.invalidate_titles()
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def invalidate_titles_on_genre_change(sender, instance, action, reverse,
+                                      pk_set, **kwargs):
+    """
+    Со стороны произведения сбрасывается оно само, со стороны жанра —
+    добавленные или убранные произведения.
+    """
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if not reverse:
+        response_cache.invalidate_titles((instance.pk,))
+    elif pk_set is not None:
+        response_cache.invalidate_titles(pk_set)
+    else:
+        response_cache.invalidate_catalogue()
+
+
+@receiver(post_save, sender=Genre)
+def invalidate_titles_on_genre_save(sender, instance, created, **kwargs):
+    if not created:
+        response_cache.invalidate_titles(
+            Title.genre.through.objects.filter(
+                genre=instance
+            ).values_list('title_id', flat=True)
+        )
+
+
+@receiver(post_save, sender=Category)
+def invalidate_titles_on_category_save(sender, instance, created, **kwargs):
+    if not created:
+        response_cache.invalidate_titles(
+            Title.objects.filter(category=instance).values_list(
+                'pk', flat=True
+            )
+        )
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Category)
+def invalidate_titles_on_group_delete(sender, instance, **kwargs):
+    """Связи с удаленной группой к этому моменту уже сняты каскадом."""
+    response_cache.invalidate_catalogue()
+
+
+@receiver((post_save, post_delete), sender=Genre)
+def invalidate_genres(sender, **kwargs):
+    response_cache.invalidate((response_cache.GENRES_VERSION_KEY,))
+
+
+@receiver((post_save, post_delete), sender=Category)
+def invalidate_categories(sender, **kwargs):
+    response_cache.invalidate((response_cache.CATEGORIES_VERSION_KEY,))
+
+
+# Удаление отзывов и комментариев сбрасывает кэш не по каждой строке:
+# обработчик post_delete отключил бы быстрое каскадное удаление.
+# Одиночные удаления обрабатывают вьюсеты, каскадные — обработчики
+# удаления пользователя и произведения.
+@receiver(post_save, sender=Review)
+def invalidate_reviews(sender, instance, **kwargs):
+    response_cache.invalidate_discussions(title_ids=(instance.title_id,))
+
+
+@receiver(post_save, sender=Comment)
+def invalidate_comments(sender, instance, **kwargs):
+    response_cache.invalidate_discussions(review_ids=(instance.review_id,))
+
+
+@receiver(pre_delete, sender=User)
+def invalidate_author_discussions(sender, instance, **kwargs):
+    """
+    Сбрасывает одним вызовом списки, из которых каскадом уйдут
+    отзывы и комментарии пользователя.
+    """
+    reviews = list(Review.objects.filter(author=instance).values_list(
+        'pk', 'title_id'
+    ))
+    response_cache.invalidate_discussions(
+        title_ids={title_id for _, title_id in reviews},
+        review_ids={
+            *(pk for pk, _ in reviews),
+            *Comment.objects.filter(author=instance).values_list(
+                'review_id', flat=True
+            ),
+        },
+    )
+
+
+@receiver(pre_delete, sender=Title)
+def invalidate_title_discussions(sender, instance, **kwargs):
+    response_cache.invalidate_discussions(
+        title_ids=(instance.pk,),
+        review_ids=Review.objects.filter(title=instance).values_list(
+            'pk', flat=True
+        ),
+    )
+
+
+@receiver((post_save, post_delete), sender=User)
+def invalidate_users(sender, **kwargs):
+    response_cache.invalidate((response_cache.USERS_VERSION_KEY,))
@@ -4,6 +4,7 @@ from rest_framework.routers import DefaultRouter
 from api.views import (
     CategoryViewSet, CommentViewSet,
     GenreViewSet, ReviewViewSet, TitleViewSet,
+    autocomplete_view,
 )
 
 router = DefaultRouter()
@@ -21,5 +22,6 @@ router.register(
 )
 
 urlpatterns = [
+    path('v1/autocomplete/', autocomplete_view, name='autocomplete'),
     path('v1/', include(router.urls)),
 ]
@@ -1,68 +1,152 @@
+from django.conf import settings
+from django.db import transaction
 from django.shortcuts import get_object_or_404
 from django_filters.rest_framework import DjangoFilterBackend
 from rest_framework import status
+from rest_framework.decorators import action, api_view, permission_classes
 from rest_framework.exceptions import ValidationError
 from rest_framework.filters import SearchFilter
-from rest_framework.permissions import IsAuthenticatedOrReadOnly
+from rest_framework.permissions import AllowAny, IsAuthenticatedOrReadOnly
 from rest_framework.response import Response
 from rest_framework.viewsets import ModelViewSet
 
-from api.filters import TitleFilter
+from api import cache as response_cache
+from api.filters import (
+    NormalizedSearchFilter,
+    StableOrderingFilter,
+    TitleFilter,
+    TitleSearchFilter,
+)
+from api.mixins import (
+    ConditionalGetMixin,
+    SparseFieldsetMixin,
+    TitleExpandMixin,
+    TitleResponseCacheMixin,
+    TopTitlesMixin,
+)
+from api.pagination import get_limit
 from api.serializers import (
     CategorySerializer,
     CommentSerializer,
     GenreSerializer,
     ReviewSerializer,
-    TitleCreateSerializer, TitleReadSerializer,
+    ScoreDistributionSerializer,
+    TitleCreateSerializer,
+    TitleFastReadSerializer,
+    TitleReadSerializer,
+    TitleRecord,
+)
+from reviews import autocomplete, leaderboards
+from reviews.constants import (
+    AUTOCOMPLETE_SIZE,
+    BATCH_TITLES_MAX_SIZE,
+    BULK_TITLES_MAX_SIZE,
+    ID_MAX,
+    ID_MIN,
 )
 from reviews.models import (
     Category,
     Comment,
     Genre,
     Review,
+    ScoreDistribution,
     Title,
 )
 from users.permissions import IsAdminOrReadOnly, IsOwnerAdminModerator
 
 
-class GenreViewSet(ModelViewSet):
+class GenreViewSet(ConditionalGetMixin, TopTitlesMixin, ModelViewSet):
     queryset = Genre.objects.all()
     serializer_class = GenreSerializer
     lookup_field = 'slug'
     permission_classes = (IsAdminOrReadOnly,)
     http_method_names = ('get', 'post', 'delete')
-    filter_backends = (SearchFilter,)
-    search_fields = ('name',)
+    filter_backends = (NormalizedSearchFilter,)
+    search_fields = ('normalized_name',)
+    leaderboard_kind = leaderboards.GENRE
+
+    def get_version_keys(self):
+        return (response_cache.GENRES_VERSION_KEY,)
 
     def retrieve(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
-class CategoryViewSet(ModelViewSet):
+class CategoryViewSet(ConditionalGetMixin, TopTitlesMixin, ModelViewSet):
     queryset = Category.objects.all()
     serializer_class = CategorySerializer
     lookup_field = 'slug'
     permission_classes = (IsAdminOrReadOnly,)
     http_method_names = ('get', 'post', 'delete')
-    filter_backends = (SearchFilter,)
-    search_fields = ('name',)
+    filter_backends = (NormalizedSearchFilter,)
+    search_fields = ('normalized_name',)
+    leaderboard_kind = leaderboards.CATEGORY
+
+    def get_version_keys(self):
+        return (response_cache.CATEGORIES_VERSION_KEY,)
 
     def retrieve(self, request, *args, **kwargs):
         return Response(status=status.HTTP_405_METHOD_NOT_ALLOWED)
 
 
-class TitleViewSet(ModelViewSet):
-    queryset = Title.objects.all()
+class TitleViewSet(ConditionalGetMixin, TitleResponseCacheMixin,
+                   SparseFieldsetMixin, TitleExpandMixin, ModelViewSet):
+    queryset = Title.objects.with_relations()
+    # Как во вложенных маршрутах: нечисловой id — 404, а не ошибка БД.
+    lookup_value_regex = r'\d+'
     permission_classes = (IsAdminOrReadOnly,)
     http_method_names = ('get', 'post', 'patch', 'delete')
-    filter_backends = (DjangoFilterBackend,)
+    filter_backends = (
+        DjangoFilterBackend, StableOrderingFilter, TitleSearchFilter
+    )
     filterset_class = TitleFilter
+    ordering_fields = ('rating', 'weighted_rating', 'year', 'name')
+    ordering = ('id',)
+    cursor_ordering = ('id',)
+    # Точное количество в списке не пересчитывается COUNT(*) на каждый
+    # запрос, а кэшируется до изменения произведений.
+    count_version_key = response_cache.TITLE_COUNTS_VERSION_KEY
+    sparse_actions = ('list', 'retrieve', 'batch')
+    sparse_columns = {
+        'genre': (),
+        'category': ('category', 'category__name', 'category__slug'),
+    }
+
+    def use_fast_read(self):
+        """Частичные ответы собирает обычный сериализатор."""
+        return (
+            self.action == 'list' and settings.TITLES_FAST_READ
+            and not self.has_sparse_params()
+        )
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if self.use_fast_read():
+            return queryset.prefetch_related(None).values(
+                *TitleRecord.VALUES
+            )
+        if not self.requests_field('genre'):
+            queryset = queryset.prefetch_related(None)
+        if not self.requests_field('category'):
+            queryset = queryset.select_related(None)
+        return self.defer_unused_columns(queryset)
 
     def get_serializer_class(self):
-        if self.action in ('list', 'retrieve'):
+        if self.use_fast_read():
+            return TitleFastReadSerializer
+        if self.action in ('list', 'retrieve', 'batch'):
             return TitleReadSerializer
         return TitleCreateSerializer
 
+    def get_version_keys(self):
+        if self.action == 'retrieve':
+            return (
+                response_cache.title_version_key(self.kwargs['pk']),
+                response_cache.CATALOGUE_VERSION_KEY,
+                *self.get_expand_version_keys(self.kwargs['pk']),
+            )
+        return (response_cache.TITLES_VERSION_KEY,)
+
     def save_and_respond(self, serializer, status_code):
         """
         Общая логика сохранения и возврата данных
@@ -74,6 +158,8 @@ class TitleViewSet(ModelViewSet):
         ) if status_code == status.HTTP_201_CREATED else self.perform_update(
             serializer
         )
+        # Жанры могли измениться: сбрасываем подгруженные prefetch_related.
+        serializer.instance._prefetched_objects_cache = {}
         read_serializer = TitleReadSerializer(
             serializer.instance,
             context={'request': self.request}
@@ -102,14 +188,178 @@ class TitleViewSet(ModelViewSet):
         )
         return self.save_and_respond(serializer, status.HTTP_200_OK)
 
+    @action(detail=False, methods=('post', 'patch', 'delete'))
+    def bulk(self, request):
+        """
+        Массовые операции для синхронизации каталога. Тело запроса:
+        список произведений для POST, список изменений с id для PATCH,
+        список id для DELETE. Каждый запрос выполняется одной транзакцией.
+        """
+        return {
+            'POST': self.bulk_create,
+            'PATCH': self.bulk_update,
+            'DELETE': self.bulk_destroy,
+        }[request.method](request)
+
+    def bulk_create(self, request):
+        serializer = self.get_serializer(data=request.data, many=True)
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return self.bulk_response(serializer.instance, status.HTTP_201_CREATED)
+
+    def bulk_update(self, request):
+        items = request.data
+        if not isinstance(items, list):
+            raise ValidationError({'id': 'Ожидается список произведений.'})
+        titles = self.get_bulk_titles([
+            item.get('id') if isinstance(item, dict) else None
+            for item in items
+        ])
+        serializer = self.get_serializer(
+            titles, data=items, many=True, partial=True
+        )
+        serializer.is_valid(raise_exception=True)
+        serializer.save()
+        return self.bulk_response(serializer.instance, status.HTTP_200_OK)
+
+    def bulk_destroy(self, request):
+        titles = self.get_bulk_titles(request.data)
+        with transaction.atomic():
+            Title.objects.filter(
+                pk__in=[title.pk for title in titles]
+            ).bulk_delete()
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+    @staticmethod
+    def get_bulk_titles(ids):
+        """
+        Произведения по списку id из тела запроса в том же порядке.
+        id должны быть целыми, без повторов и существовать.
+        """
+        if (
+            not isinstance(ids, list) or not ids
+            or not all(type(pk) is int for pk in ids)
+        ):
+            raise ValidationError({'id': 'Ожидается список id произведений.'})
+        if not all(ID_MIN <= pk <= ID_MAX for pk in ids):
+            raise ValidationError({'id': 'Передан несуществующий id.'})
+        if len(ids) > BULK_TITLES_MAX_SIZE:
+            raise ValidationError({'id': (
+                f'За один запрос можно передать не больше '
+                f'{BULK_TITLES_MAX_SIZE} произведений.'
+            )})
+        if len(set(ids)) != len(ids):
+            raise ValidationError({'id': 'id произведений повторяются.'})
+        titles = Title.objects.in_bulk(ids)
+        missing = [pk for pk in ids if pk not in titles]
+        if missing:
+            raise ValidationError({'id': (
+                f'Произведения не найдены: {", ".join(map(str, missing))}.'
+            )})
+        return [titles[pk] for pk in ids]
+
+    @staticmethod
+    def bulk_response(titles, status_code):
+        """
+        Итоговые данные произведений через быстрый сериализатор:
+        два запроса на весь список.
+        """
+        rows = {
+            row['id']: row for row in Title.objects.filter(
+                pk__in=[title.pk for title in titles]
+            ).values(*TitleRecord.VALUES)
+        }
+        return Response(TitleFastReadSerializer(
+            [rows[title.pk] for title in titles], many=True
+        ).data, status=status_code)
+
+    @action(detail=False, methods=('get',))
+    def batch(self, request):
+        """
+        Произведения по списку ?ids=1,5,9 в порядке запроса, без
+        пагинации. Категории и жанры подгружаются общими запросами,
+        несуществующие id пропускаются.
+        """
+        return self.conditional_response(self.cached_batch, request)
+
+    def cached_batch(self, request):
+        return self.cached_response(
+            response_cache.title_list_key(request, 'batch'),
+            self.get_batch, request
+        )
+
+    def get_batch(self, request):
+        ids = self.get_batch_ids()
+        titles = self.get_queryset().in_bulk(ids)
+        return Response(self.get_serializer(
+            [titles[pk] for pk in ids if pk in titles], many=True
+        ).data)
+
+    def get_batch_ids(self):
+        """id из ?ids= без повторов, в порядке первого упоминания."""
+        values = self.request.query_params.get('ids', '').split(',')
+        try:
+            ids = [int(value) for value in values if value]
+        except ValueError:
+            raise ValidationError({'ids': 'Ожидаются id через запятую.'})
+        if not all(ID_MIN <= pk <= ID_MAX for pk in ids):
+            raise ValidationError({'ids': 'Передан несуществующий id.'})
+        ids = list(dict.fromkeys(ids))
+        if not ids:
+            raise ValidationError({'ids': 'Передайте id через запятую.'})
+        if len(ids) > BATCH_TITLES_MAX_SIZE:
+            raise ValidationError({'ids': (
+                f'За один запрос можно получить не больше '
+                f'{BATCH_TITLES_MAX_SIZE} произведений.'
+            )})
+        return ids
+
+    @action(detail=False, methods=('get',))
+    def facets(self, request):
+        """
+        Количество произведений по жанрам, категориям и годам
+        с учетом текущих параметров фильтрации.
+        """
+        return self.conditional_response(self.cached_facets, request)
+
+    def cached_facets(self, request):
+        return self.cached_response(
+            response_cache.title_list_key(request, 'facets'),
+            lambda request: Response(self.filter_queryset(
+                self.get_queryset()
+            ).facet_counts()),
+            request
+        )
 
-class ReviewViewSet(ModelViewSet):
+    @action(detail=True, methods=('get',), url_path='rating-distribution')
+    def rating_distribution(self, request, pk=None):
+        """
+        Возвращает количество отзывов по каждой оценке
+        из хранимой гистограммы, не перебирая отзывы.
+        """
+        distribution = ScoreDistribution.objects.filter(title_id=pk).first()
+        if distribution is None:
+            distribution = ScoreDistribution(
+                title=get_object_or_404(Title.objects.only('pk'), pk=pk)
+            )
+        return Response(ScoreDistributionSerializer(distribution).data)
+
+
+class ReviewViewSet(ConditionalGetMixin, SparseFieldsetMixin, ModelViewSet):
     serializer_class = ReviewSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,
                           IsOwnerAdminModerator)
     filter_backends = (SearchFilter,)
     search_fields = ('name',)
     http_method_names = ('get', 'post', 'patch', 'delete')
+    cursor_ordering = ('-pub_date', '-id')
+    sparse_columns = {'author': ('author', 'author__username')}
+
+    def get_version_keys(self):
+        return (
+            response_cache.reviews_version_key(self.kwargs['title_id']),
+            response_cache.USERS_VERSION_KEY,
+        )
 
     def perform_create(self, serializer):
         """
@@ -122,20 +372,37 @@ class ReviewViewSet(ModelViewSet):
             raise ValidationError('Вы уже оставляли здесь отзыв.')
         serializer.save(author=self.request.user, title=title)
 
+    def perform_destroy(self, instance):
+        title_id, review_id = instance.title_id, instance.pk
+        super().perform_destroy(instance)
+        response_cache.invalidate_discussions((title_id,), (review_id,))
+
     def get_queryset(self):
         """
         Возвращает все отзывы для конкретного произведения.
         """
-        return Review.objects.filter(title_id=self.kwargs['title_id'])
+        queryset = Review.objects.filter(title_id=self.kwargs['title_id'])
+        if self.requests_field('author'):
+            queryset = queryset.select_related('author')
+        return self.defer_unused_columns(queryset)
 
 
-class CommentViewSet(ModelViewSet):
+class CommentViewSet(ConditionalGetMixin, SparseFieldsetMixin,
+                     ModelViewSet):
     serializer_class = CommentSerializer
     permission_classes = (IsAuthenticatedOrReadOnly,
                           IsOwnerAdminModerator)
     filter_backends = (SearchFilter,)
     search_fields = ('name',)
     http_method_names = ('get', 'post', 'patch', 'delete')
+    cursor_ordering = ('pub_date', 'id')
+    sparse_columns = {'author': ('author', 'author__username')}
+
+    def get_version_keys(self):
+        return (
+            response_cache.comments_version_key(self.kwargs['review_id']),
+            response_cache.USERS_VERSION_KEY,
+        )
 
     def get_queryset(self):
         """
@@ -146,7 +413,10 @@ class CommentViewSet(ModelViewSet):
         review_id = self.kwargs['review_id']
         title = get_object_or_404(Title, pk=title_id)
         review = get_object_or_404(Review, pk=review_id, title=title)
-        return Comment.objects.filter(review=review)
+        queryset = Comment.objects.filter(review=review)
+        if self.requests_field('author'):
+            queryset = queryset.select_related('author')
+        return self.defer_unused_columns(queryset)
 
     def perform_create(self, serializer):
         """
@@ -159,3 +429,22 @@ class CommentViewSet(ModelViewSet):
         review = get_object_or_404(Review, pk=review_id, title=title)
         serializer.save(author=self.request.user, review=review)
         return Response(serializer.data, status=status.HTTP_201_CREATED)
+
+    def perform_destroy(self, instance):
+        super().perform_destroy(instance)
+        response_cache.invalidate_discussions(
+            review_ids=(instance.review_id,)
+        )
+
+
+@api_view(['GET'])
+@permission_classes([AllowAny])
+def autocomplete_view(request):
+    """
+    Подсказки по началу слов в названиях произведений, жанров
+    и категорий из индекса в памяти процесса, без запросов к БД.
+    """
+    return Response(autocomplete.suggest(
+        request.query_params.get('q', ''),
+        get_limit(request, AUTOCOMPLETE_SIZE)
+    ))
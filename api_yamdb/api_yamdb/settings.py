@@ -65,6 +65,24 @@ DATABASES = {
 }
 
 
+# Версии кэша ответов, ETag и Last-Modified, рейтинг-листы и индекс
+# подсказок хранятся в кэше. LocMemCache подходит только для одного
+# процесса (runserver, тесты). При нескольких процессах нужен общий кэш
+# с атомарным incr, иначе при DEBUG = False проект не запустится
+# (ImproperlyConfigured при загрузке приложения api):
+# CACHES = {
+#     'default': {
+#         'BACKEND': 'django.core.cache.backends.memcached.PyMemcacheCache',
+#         'LOCATION': '127.0.0.1:11211',
+#     }
+# }
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+
 AUTH_PASSWORD_VALIDATORS = [
     {
         'NAME': 'django.contrib.auth.password_validation.UserAttributeSimilarityValidator',
@@ -102,13 +120,21 @@ REST_FRAMEWORK = {
         'rest_framework_simplejwt.authentication.JWTAuthentication',
     ],
     'DEFAULT_PAGINATION_CLASS':
-        'rest_framework.pagination.PageNumberPagination',
+        'api.pagination.OptionalCursorPagination',
     'PAGE_SIZE': 5,
     'DEFAULT_FILTER_BACKENDS': [
         'django_filters.rest_framework.DjangoFilterBackend',
     ],
 }
 
+# Список произведений собирается из строк values() сериализатором
+# TitleFastReadSerializer в обход полей DRF.
+TITLES_FAST_READ = False
+
+# Бэкенд поиска ?search= по произведениям. Для СУБД без FTS5:
+# 'reviews.search.SearchBackend'.
+TITLE_SEARCH_BACKEND = 'reviews.search.FTS5SearchBackend'
+
 SIMPLE_JWT = {
     'ACCESS_TOKEN_LIFETIME': timedelta(days=5),
     'AUTH_HEADER_TYPES': ('Bearer',),
@@ -0,0 +1,175 @@
+import re
+import threading
+import time
+from bisect import bisect_left, insort
+
+from django.apps import apps
+from django.core.cache import cache
+
+from reviews.search import normalize_text
+
+TITLE = 'title'
+GENRE = 'genre'
+CATEGORY = 'category'
+
+# Версия каталога в кэше: по ней процессы узнают об изменениях,
+# сделанных другими процессами, и перестраивают свой индекс. Поэтому
+# при нескольких процессах кэш должен быть общим и с атомарным incr
+# (см. CACHES в settings и проверку api.E001).
+VERSION_KEY = 'autocomplete:version'
+
+
+class PrefixIndex:
+    """
+    Отсортированный массив ключей (нормализованный текст, тип, id)
+    для поиска по префиксу через bisect. Каждое название попадает
+    в массив со всех начал слов, чтобы находиться по любому слову.
+    """
+
+    def __init__(self):
+        self.keys = []
+        self.items = {}
+        self.version = None
+        self.lock = threading.Lock()
+
+    @staticmethod
+    def make_keys(kind, pk, name):
+        text = normalize_text(name)
+        return [
+            (text[match.start():], kind, pk)
+            for match in re.finditer(r'\w+', text)
+        ]
+
+    def fill(self, items, version):
+        """Заменяет содержимое индекса: items — (тип, id, данные)."""
+        keys = []
+        stored = {}
+        for kind, pk, data in items:
+            item_keys = self.make_keys(kind, pk, data['name'])
+            stored[kind, pk] = (data, item_keys)
+            keys.extend(item_keys)
+        keys.sort()
+        with self.lock:
+            self.keys = keys
+            self.items = stored
+            self.version = version
+
+    def add(self, kind, pk, data):
+        with self.lock:
+            self._remove(kind, pk)
+            item_keys = self.make_keys(kind, pk, data['name'])
+            self.items[kind, pk] = (data, item_keys)
+            for key in item_keys:
+                insort(self.keys, key)
+
+    def remove(self, kind, pk):
+        with self.lock:
+            self._remove(kind, pk)
+
+    def _remove(self, kind, pk):
+        _, item_keys = self.items.pop((kind, pk), (None, ()))
+        for key in item_keys:
+            position = bisect_left(self.keys, key)
+            if position < len(self.keys) and self.keys[position] == key:
+                del self.keys[position]
+
+    def search(self, prefix, limit):
+        """
+        Данные до limit объектов, в названии которых есть слово
+        с началом prefix, по алфавиту.
+        """
+        prefix = normalize_text(prefix).strip()
+        if not prefix:
+            return []
+        found = {}
+        with self.lock:
+            position = bisect_left(self.keys, (prefix,))
+            while len(found) < limit and position < len(self.keys):
+                text, kind, pk = self.keys[position]
+                if not text.startswith(prefix):
+                    break
+                found.setdefault((kind, pk), self.items[kind, pk][0])
+                position += 1
+        return list(found.values())
+
+
+_index = PrefixIndex()
+
+
+def _current_version():
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _catalogue():
+    """Все названия каталога тремя запросами."""
+    for kind, model_name in (
+        (TITLE, 'Title'), (GENRE, 'Genre'), (CATEGORY, 'Category')
+    ):
+        model = apps.get_model('reviews', model_name)
+        for obj in model.objects.only(
+            *(('name',) if kind == TITLE else ('name', 'slug'))
+        ).iterator():
+            yield kind, obj.pk, serialize(kind, obj)
+
+
+def serialize(kind, obj):
+    if kind == TITLE:
+        return {'type': kind, 'id': obj.pk, 'name': obj.name}
+    return {'type': kind, 'slug': obj.slug, 'name': obj.name}
+
+
+def suggest(query, limit):
+    """
+    Подсказки для набираемого запроса. Индекс перестраивается,
+    только если каталог менял другой процесс.
+    """
+    version = _current_version()
+    if version != _index.version:
+        _index.fill(_catalogue(), version)
+    return _index.search(query, limit)
+
+
+def _mark_changed():
+    """
+    Сдвигает общую версию. Если до этого ее никто не менял,
+    индекс процесса уже актуален, иначе он перестроится при поиске.
+    """
+    try:
+        version = cache.incr(VERSION_KEY)
+    except ValueError:
+        version = None
+    with _index.lock:
+        if (
+            version is None or _index.version is None
+            or version != _index.version + 1
+        ):
+            _index.version = None
+        else:
+            _index.version = version
+
+
+def update(kind, obj):
+    """Добавляет или обновляет объект после коммита его сохранения."""
+    if _index.version is not None:
+        _index.add(kind, obj.pk, serialize(kind, obj))
+    _mark_changed()
+
+
+def remove(kind, pk):
+    if _index.version is not None:
+        _index.remove(kind, pk)
+    _mark_changed()
+
+
+def invalidate():
+    """
+    После массовых изменений индекс процесса не правится
+    по одному объекту, а перестраивается при следующем поиске.
+    """
+    _mark_changed()
+    with _index.lock:
+        _index.version = None
@@ -1,3 +1,31 @@
 TITLE_NAME_MAX_LENGHT: int = 256
 CATEGORY_NAME_MAX_LENGHT: int = 256
 GENRE_NAME_MAX_LENGHT: int = 256
+RATING_RECOMPUTE_BATCH_SIZE: int = 500
+SCORE_MIN: int = 1
+SCORE_MAX: int = 10
+# Байесовский рейтинг: к оценкам произведения добавляется
+# WEIGHTED_RATING_PRIOR_REVIEWS условных отзывов с оценкой
+# WEIGHTED_RATING_PRIOR_SCORE, чтобы мало оцененные произведения
+# не обгоняли популярные.
+WEIGHTED_RATING_PRIOR_SCORE: float = 5.5
+WEIGHTED_RATING_PRIOR_REVIEWS: int = 10
+# Сколько лучших произведений отдает эндпоинт top
+# и сколько хранит кэшированный рейтинг-лист жанра или категории.
+LEADERBOARD_SIZE: int = 10
+LEADERBOARD_DEPTH: int = 30
+LEADERBOARD_TIMEOUT: int = 60 * 60
+# Сколько подсказок отдает эндпоинт autocomplete.
+AUTOCOMPLETE_SIZE: int = 10
+# Сколько последних отзывов встраивает ?expand=reviews.
+EXPANDED_REVIEWS_SIZE: int = 10
+# Сколько произведений принимает один запрос к titles/bulk.
+BULK_TITLES_MAX_SIZE: int = 1000
+# Сколько id произведений принимает один запрос к titles/batch.
+BATCH_TITLES_MAX_SIZE: int = 100
+# Границы id, которые принимает БД: знаковое 64-битное целое.
+ID_MIN: int = -2 ** 63
+ID_MAX: int = 2 ** 63 - 1
+# Категория, которая подставляется произведению без категории.
+DEFAULT_CATEGORY_SLUG: str = 'no-category'
+DEFAULT_CATEGORY_NAME: str = 'Без категории'
@@ -0,0 +1,159 @@
+import time
+
+from django.apps import apps
+from django.core.cache import cache
+
+from reviews.constants import LEADERBOARD_DEPTH, LEADERBOARD_TIMEOUT
+
+GENRE = 'genre'
+CATEGORY = 'category'
+
+VERSION_KEY = 'leaderboards:version'
+# Сколько секунд живет блокировка листа, если обновивший его
+# процесс не успел ее снять.
+LOCK_TIMEOUT = 10
+
+
+def _version():
+    """
+    Текущая версия рейтинг-листов. Начальное значение берется
+    из времени, чтобы после очистки кэша версии не повторялись.
+    """
+    version = cache.get(VERSION_KEY)
+    if version is None:
+        cache.add(VERSION_KEY, time.time_ns(), None)
+        version = cache.get(VERSION_KEY)
+    return version
+
+
+def _stamp_key(kind, group_id, version):
+    return f'leaderboards:{version}:{kind}:{group_id}:stamp'
+
+
+def _stamp(kind, group_id, version):
+    """
+    Метка листа группы входит в его ключ. Лист, собранный по данным
+    до смены метки, сохраняется под старым ключом и не читается.
+    """
+    key = _stamp_key(kind, group_id, version)
+    stamp = cache.get(key)
+    if stamp is None:
+        cache.add(key, time.time_ns(), None)
+        stamp = cache.get(key)
+    return stamp
+
+
+def _key(kind, group_id, version, stamp):
+    return f'leaderboards:{version}:{kind}:{group_id}:{stamp}'
+
+
+def _build(kind, group_id):
+    """
+    Собирает рейтинг-лист одним запросом по индексу (rating, id).
+    complete означает, что в лист попали все оцененные произведения группы.
+    """
+    Title = apps.get_model('reviews', 'Title')
+    entries = list(
+        Title.objects.filter(
+            **{kind: group_id}, rating__isnull=False
+        ).order_by('-rating', '-id').values_list(
+            'rating', 'pk'
+        )[:LEADERBOARD_DEPTH]
+    )
+    return {'entries': entries, 'complete': len(entries) < LEADERBOARD_DEPTH}
+
+
+def _apply(board, title_id, rating):
+    """
+    Переносит произведение на новое место в листе.
+    Возвращает None, если без запроса к БД лист не восстановить:
+    произведение выбыло из неполного листа и его место некому занять.
+    """
+    entries = [entry for entry in board['entries'] if entry[1] != title_id]
+    was_listed = len(entries) != len(board['entries'])
+    candidate = None if rating is None else (rating, title_id)
+    if candidate is not None and (
+        board['complete'] or (entries and candidate > tuple(entries[-1]))
+    ):
+        entries.append(candidate)
+        entries.sort(reverse=True)
+    elif was_listed and not board['complete']:
+        return None
+    return {
+        'entries': entries[:LEADERBOARD_DEPTH],
+        'complete': board['complete'] and len(entries) <= LEADERBOARD_DEPTH,
+    }
+
+
+def top_title_ids(kind, group_id, limit):
+    """Возвращает id лучших произведений жанра или категории."""
+    version = _version()
+    # Ключ вычисляется до сборки: если рейтинг изменится, пока лист
+    # собирается, refresh_titles сменит метку и лист не будет прочитан.
+    key = _key(kind, group_id, version, _stamp(kind, group_id, version))
+    board = cache.get(key)
+    if board is None:
+        board = _build(kind, group_id)
+        cache.add(key, board, LEADERBOARD_TIMEOUT)
+    return [title_id for _, title_id in board['entries'][:limit]]
+
+
+def refresh_titles(title_ids):
+    """
+    Обновляет закэшированные листы жанров и категорий произведений
+    после изменения их рейтинга. У некэшированных листов меняется
+    метка: лист, который собирается прямо сейчас по старым данным,
+    не будет прочитан, а новый соберется при первом запросе.
+    """
+    Title = apps.get_model('reviews', 'Title')
+    groups = {}
+    ratings = {}
+    for title_id, rating, category_id in Title.objects.filter(
+        pk__in=title_ids
+    ).values_list('pk', 'rating', 'category_id'):
+        ratings[title_id] = rating
+        if category_id is not None:
+            groups.setdefault((CATEGORY, category_id), []).append(title_id)
+    for title_id, genre_id in Title.genre.through.objects.filter(
+        title_id__in=ratings
+    ).values_list('title_id', 'genre_id'):
+        groups.setdefault((GENRE, genre_id), []).append(title_id)
+
+    version = _version()
+    for (kind, group_id), group_title_ids in groups.items():
+        key = _key(kind, group_id, version, _stamp(kind, group_id, version))
+        # Лист правит один процесс за раз. Кто не взял блокировку,
+        # меняет метку: лист соберется заново, а правка держателя
+        # блокировки уйдет под старый ключ.
+        if not cache.add(f'{key}:lock', True, LOCK_TIMEOUT):
+            _invalidate_group(kind, group_id, version)
+            continue
+        try:
+            board = cache.get(key)
+            for title_id in group_title_ids:
+                if board is None:
+                    break
+                board = _apply(board, title_id, ratings[title_id])
+            if board is None:
+                _invalidate_group(kind, group_id, version)
+            else:
+                cache.set(key, board, LEADERBOARD_TIMEOUT)
+        finally:
+            cache.delete(f'{key}:lock')
+
+
+def _invalidate_group(kind, group_id, version):
+    cache.set(_stamp_key(kind, group_id, version), time.time_ns(), None)
+
+
+def invalidate_group(kind, group_id):
+    """Сбрасывает лист одного жанра или одной категории."""
+    _invalidate_group(kind, group_id, _version())
+
+
+def invalidate_all():
+    """
+    Сбрасывает все листы сменой версии. Нужен при изменении состава
+    жанров и категорий у оцененных произведений, что бывает редко.
+    """
+    cache.set(VERSION_KEY, time.time_ns(), None)
@@ -0,0 +1,130 @@
+import math
+from collections import defaultdict
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import transaction
+from django.db.models import Count, Sum
+
+from reviews.constants import RATING_RECOMPUTE_BATCH_SIZE, SCORE_MAX, SCORE_MIN
+from reviews.models import Review, ScoreDistribution, Title, weighted_rating
+from reviews.ratings import notify_rating_changed
+
+
+class Command(BaseCommand):
+    help = (
+        'Сверка рейтинга и гистограмм оценок произведений с отзывами '
+        'групповыми запросами по пачкам и пересчет расходящихся'
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            '--titles', type=int, nargs='+', metavar='ID',
+            help='Пересчитать только произведения с указанными id'
+        )
+        parser.add_argument(
+            '--verify', action='store_true',
+            help='Только показать расхождения, ничего не записывая'
+        )
+        parser.add_argument(
+            '--batch-size', type=int, default=RATING_RECOMPUTE_BATCH_SIZE,
+            help='Количество произведений в одной пачке'
+        )
+
+    def handle(self, *args, **options):
+        titles = Title.objects.order_by('pk')
+        if options['titles']:
+            titles = titles.filter(pk__in=options['titles'])
+        title_ids = list(titles.values_list('pk', flat=True))
+        total = len(title_ids)
+        batch_size = max(options['batch_size'], 1)
+        rating_drift = histogram_drift = 0
+        for start in range(0, total, batch_size):
+            batch = title_ids[start:start + batch_size]
+            ratings, histograms = self.check_batch(batch)
+            rating_drift += len(ratings)
+            histogram_drift += len(histograms)
+            if not options['verify']:
+                self.fix_batch(ratings, histograms)
+            self.report_progress(start + len(batch), total)
+
+        if options['verify'] and (rating_drift or histogram_drift):
+            raise CommandError(
+                f'С отзывами расходятся рейтинг {rating_drift} и '
+                f'гистограмма оценок {histogram_drift} произведений.'
+            )
+        action = 'Найдено' if options['verify'] else 'Исправлено'
+        self.stdout.write(self.style.SUCCESS(
+            f'{action} расхождений рейтинга: {rating_drift}, '
+            f'гистограмм оценок: {histogram_drift}'
+        ))
+
+    def check_batch(self, title_ids):
+        """
+        Сравнивает счетчики пачки с отзывами двумя групповыми
+        запросами и возвращает id произведений с расходящимся
+        рейтингом и с расходящейся гистограммой.
+        """
+        reviews = Review.objects.filter(title_id__in=title_ids).order_by()
+        stats = {
+            row['title_id']: (row['total'], row['count'])
+            for row in reviews.values('title_id').annotate(
+                total=Sum('score'), count=Count('id')
+            )
+        }
+        scores = defaultdict(dict)
+        for row in reviews.values('title_id', 'score').annotate(
+            count=Count('id')
+        ):
+            scores[row['title_id']][row['score']] = row['count']
+        distributions = ScoreDistribution.objects.in_bulk(title_ids)
+        ratings, histograms = [], []
+        for title in Title.objects.filter(pk__in=title_ids).only(
+            *Title.RATING_FIELDS
+        ):
+            score_sum, review_count = stats.get(title.pk, (0, 0))
+            rating = score_sum // review_count if review_count else None
+            if (title.score_sum, title.review_count, title.rating) != (
+                score_sum, review_count, rating
+            ) or not math.isclose(
+                title.weighted_rating, weighted_rating(score_sum, review_count)
+            ):
+                ratings.append(title.pk)
+                self.report_drift(title, score_sum, review_count, rating)
+            expected = [
+                (score, scores[title.pk].get(score, 0))
+                for score in range(SCORE_MIN, SCORE_MAX + 1)
+            ]
+            distribution = distributions.get(
+                title.pk, ScoreDistribution(title_id=title.pk)
+            )
+            if distribution.counts() != expected:
+                histograms.append(title.pk)
+                self.stdout.write(self.style.WARNING(
+                    f'Произведение {title.pk}: гистограмма оценок '
+                    f'расходится с отзывами'
+                ))
+        return ratings, histograms
+
+    @staticmethod
+    def fix_batch(ratings, histograms):
+        """
+        Пересчитывает расходящиеся произведения запросами, которые
+        читают отзывы в том же UPDATE: отзыв, записанный после
+        сверки, не затирается прочитанными ранее суммами.
+        """
+        with transaction.atomic():
+            if ratings:
+                Title.objects.filter(pk__in=ratings).recompute_rating()
+                notify_rating_changed(ratings)
+            if histograms:
+                ScoreDistribution.objects.rebuild(histograms)
+
+    def report_progress(self, processed, total):
+        self.stdout.write(f'Обработано произведений: {processed} из {total}')
+
+    def report_drift(self, title, score_sum, review_count, rating):
+        self.stdout.write(self.style.WARNING(
+            f'Произведение {title.pk}: рейтинг {title.rating} '
+            f'({title.score_sum}/{title.review_count}), '
+            f'по отзывам {rating} ({score_sum}/{review_count})'
+        ))
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from django.db import transaction
+
+from reviews.search import get_search_backend, search_index_rebuilt
+
+
+class Command(BaseCommand):
+    help = 'Перестроение поискового индекса произведений'
+
+    def handle(self, *args, **options):
+        with transaction.atomic():
+            count = get_search_backend().rebuild()
+            transaction.on_commit(
+                lambda: search_index_rebuilt.send(sender=self.__class__)
+            )
+        self.stdout.write(self.style.SUCCESS(
+            f'Проиндексировано произведений: {count}'
+        ))
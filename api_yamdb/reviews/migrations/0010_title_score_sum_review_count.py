@@ -0,0 +1,43 @@
+# Generated by Django 3.2 on 2026-10-18 17:58
+
+from django.db import migrations, models
+from django.db.models import Count, Sum
+
+
+def fill_rating_counters(apps, schema_editor):
+    Title = apps.get_model('reviews', 'Title')
+    Review = apps.get_model('reviews', 'Review')
+    titles = []
+    for row in Review.objects.values('title_id').annotate(
+        total=Sum('score'), count=Count('id')
+    ).order_by():
+        titles.append(Title(
+            pk=row['title_id'],
+            score_sum=row['total'],
+            review_count=row['count'],
+            rating=row['total'] // row['count'],
+        ))
+    Title.objects.bulk_update(
+        titles, ('score_sum', 'review_count', 'rating'), batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0009_alter_review_options'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='title',
+            name='review_count',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='score_sum',
+            field=models.PositiveIntegerField(default=0, editable=False),
+        ),
+        migrations.RunPython(fill_rating_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 3.2 on 2026-10-18 18:04
+
+from django.db import migrations, models
+import django.db.models.deletion
+from django.db.models import Count
+
+
+def fill_score_distributions(apps, schema_editor):
+    ScoreDistribution = apps.get_model('reviews', 'ScoreDistribution')
+    Review = apps.get_model('reviews', 'Review')
+    rows = {}
+    for row in Review.objects.values('title_id', 'score').annotate(
+        count=Count('id')
+    ).order_by():
+        rows.setdefault(row['title_id'], {})[
+            f'score_{row["score"]}'
+        ] = row['count']
+    ScoreDistribution.objects.bulk_create(
+        (
+            ScoreDistribution(title_id=title_id, **counts)
+            for title_id, counts in rows.items()
+        ),
+        batch_size=500
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0010_title_score_sum_review_count'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ScoreDistribution',
+            fields=[
+                ('title', models.OneToOneField(on_delete=django.db.models.deletion.CASCADE, primary_key=True, related_name='score_distribution', serialize=False, to='reviews.title')),
+                ('score_1', models.PositiveIntegerField(default=0)),
+                ('score_2', models.PositiveIntegerField(default=0)),
+                ('score_3', models.PositiveIntegerField(default=0)),
+                ('score_4', models.PositiveIntegerField(default=0)),
+                ('score_5', models.PositiveIntegerField(default=0)),
+                ('score_6', models.PositiveIntegerField(default=0)),
+                ('score_7', models.PositiveIntegerField(default=0)),
+                ('score_8', models.PositiveIntegerField(default=0)),
+                ('score_9', models.PositiveIntegerField(default=0)),
+                ('score_10', models.PositiveIntegerField(default=0)),
+            ],
+            options={
+                'verbose_name': 'Распределение оценок',
+                'verbose_name_plural': 'Распределения оценок',
+            },
+        ),
+        migrations.RunPython(
+            fill_score_distributions, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,44 @@
+from django.db import migrations
+
+TABLE = 'reviews_title_fts'
+
+
+def normalize_text(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def create_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+        f"name, description, tokenize='unicode61', prefix='2 3')"
+    )
+    Title = apps.get_model('reviews', 'Title')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name, description) '
+            f'VALUES (%s, %s, %s)',
+            [
+                (pk, normalize_text(name), normalize_text(description))
+                for pk, name, description in Title.objects.values_list(
+                    'pk', 'name', 'description'
+                ).iterator()
+            ]
+        )
+
+
+def drop_search_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0013_review_comment_keyset_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_search_index, drop_search_index),
+    ]
@@ -0,0 +1,46 @@
+# Generated by Django 3.2 on 2026-10-18 18:23
+
+from django.db import migrations, models
+
+
+def normalize_text(text):
+    return text.casefold().replace('ё', 'е')
+
+
+def fill_normalized_names(apps, schema_editor):
+    for model_name in ('Title', 'Genre', 'Category'):
+        model = apps.get_model('reviews', model_name)
+        objects = list(model.objects.only('name'))
+        for obj in objects:
+            obj.normalized_name = normalize_text(obj.name)
+        model.objects.bulk_update(
+            objects, ('normalized_name',), batch_size=500
+        )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0014_title_search_index'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='category',
+            name='normalized_name',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='genre',
+            name='normalized_name',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.AddField(
+            model_name='title',
+            name='normalized_name',
+            field=models.TextField(default='', editable=False),
+        ),
+        migrations.RunPython(
+            fill_normalized_names, migrations.RunPython.noop
+        ),
+    ]
@@ -0,0 +1,34 @@
+from django.db import migrations
+
+TABLE = 'reviews_title_name_fts'
+
+
+def create_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor != 'sqlite':
+        return
+    schema_editor.execute(
+        f'CREATE VIRTUAL TABLE IF NOT EXISTS {TABLE} USING fts5('
+        f"name, tokenize='trigram')"
+    )
+    Title = apps.get_model('reviews', 'Title')
+    with schema_editor.connection.cursor() as cursor:
+        cursor.executemany(
+            f'INSERT INTO {TABLE} (rowid, name) VALUES (%s, %s)',
+            Title.objects.values_list('pk', 'normalized_name').iterator()
+        )
+
+
+def drop_name_index(apps, schema_editor):
+    if schema_editor.connection.vendor == 'sqlite':
+        schema_editor.execute(f'DROP TABLE IF EXISTS {TABLE}')
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('reviews', '0016_title_filter_indexes'),
+    ]
+
+    operations = [
+        migrations.RunPython(create_name_index, drop_name_index),
+    ]
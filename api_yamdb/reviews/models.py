@@ -1,21 +1,215 @@
+from collections import Counter
+
 from django.contrib.auth import get_user_model
 from django.core.validators import MaxValueValidator, MinValueValidator
-from django.db import models
+from django.db import IntegrityError, models, transaction
+from django.db.models import (
+    Count, ExpressionWrapper, F, FloatField, OuterRef, Subquery, Sum
+)
+from django.db.models.functions import Coalesce, NullIf
+from django.dispatch import Signal
 
 from reviews.constants import (
     CATEGORY_NAME_MAX_LENGHT,
     GENRE_NAME_MAX_LENGHT,
+    SCORE_MAX,
+    SCORE_MIN,
     TITLE_NAME_MAX_LENGHT,
+    WEIGHTED_RATING_PRIOR_REVIEWS,
+    WEIGHTED_RATING_PRIOR_SCORE,
 )
+from reviews.ratings import defer_rating_update, notify_rating_changed
+from reviews.search import normalize_text
 
 User = get_user_model()
 
+# Отправляется после массовой записи произведений, которая идет
+# в обход save() и post_save: получатели обновляют зависимые данные.
+titles_bulk_changed = Signal()
+# Отправляется перед массовым удалением произведений в той же
+# транзакции: связанные строки еще на месте, post_delete не будет.
+titles_bulk_delete = Signal()
+
+
+def weighted_rating(score_sum, review_count):
+    """
+    Байесовский рейтинг: средняя оценка, смещенная к априорной
+    тем сильнее, чем меньше у произведения отзывов.
+    Принимает числа или выражения ORM.
+    """
+    prior = WEIGHTED_RATING_PRIOR_SCORE * WEIGHTED_RATING_PRIOR_REVIEWS
+    return (score_sum + prior) / (review_count + WEIGHTED_RATING_PRIOR_REVIEWS)
+
+
+class NormalizedNameModel(models.Model):
+    """
+    Хранит название в виде для поиска: SQLite сравнивает без учета
+    регистра только латиницу, поэтому фильтры по кириллице
+    идут по normalized_name. Обычный индекс по колонке не нужен: подстроку
+    в названии произведения ищет триграммный индекс из reviews.search.
+    """
+    normalized_name = models.TextField(editable=False, default='')
+
+    class Meta:
+        abstract = True
+
+    def save(self, *args, **kwargs):
+        self.normalized_name = normalize_text(self.name)
+        update_fields = kwargs.get('update_fields')
+        if update_fields is not None and 'name' in update_fields:
+            kwargs['update_fields'] = {*update_fields, 'normalized_name'}
+        super().save(*args, **kwargs)
+
+
+class TitleQuerySet(models.QuerySet):
+
+    def with_relations(self):
+        """Подгружает категорию и жанры для вывода произведений."""
+        # Жанры в порядке id, как и в TitleFastReadSerializer.
+        return self.select_related('category').prefetch_related(
+            models.Prefetch('genre', queryset=Genre.objects.order_by('pk'))
+        )
+
+    def bulk_insert(self, titles):
+        """
+        Создает произведения одним bulk_create и проставляет им id.
+        Вызывается внутри транзакции.
+        """
+        for title in titles:
+            title.normalized_name = normalize_text(title.name)
+        self.bulk_create(titles)
+        if titles and titles[0].pk is None:
+            # SQLite не возвращает id из bulk_create. Запись в БД
+            # заблокирована до конца транзакции, поэтому последние
+            # len(titles) id принадлежат только что вставленным строкам.
+            ids = sorted(self.order_by('-pk').values_list(
+                'pk', flat=True
+            )[:len(titles)])
+            for title, pk in zip(titles, ids):
+                title.pk = pk
+        return titles
+
+    def bulk_delete(self):
+        """
+        Удаляет выбранные произведения вместе с отзывами, комментариями,
+        гистограммами и жанрами по одному запросу на таблицу. Сигналы
+        по каждому произведению не отправляются, получатели узнают
+        об удалении из одного titles_bulk_delete.
+        Вызывается внутри транзакции.
+        """
+        title_ids = list(self.order_by().values_list('pk', flat=True))
+        if not title_ids:
+            return 0
+        titles_bulk_delete.send(sender=self.model, title_ids=title_ids)
+        for queryset in (
+            Comment.objects.filter(review__title_id__in=title_ids),
+            Review.objects.filter(title_id__in=title_ids),
+            ScoreDistribution.objects.filter(title_id__in=title_ids),
+            self.model.genre.through.objects.filter(title_id__in=title_ids),
+        ):
+            queryset._raw_delete(queryset.db)
+        return self.model.objects.filter(pk__in=title_ids)._raw_delete(
+            self.db
+        )
 
-class Title(models.Model):
+    def bulk_add_genres(self, genres_by_title):
+        """Жанры нескольких произведений одной пачкой вставок."""
+        through = self.model.genre.through
+        through.objects.bulk_create(
+            through(title_id=title_id, genre_id=genre.pk)
+            for title_id, genres in genres_by_title.items()
+            for genre in dict.fromkeys(genres)
+        )
+
+    def facet_counts(self):
+        """
+        Количество выбранных произведений по жанрам, категориям
+        и годам четырьмя групповыми запросами.
+        """
+        titles = Title.objects.filter(
+            pk__in=self.order_by().values('pk')
+        ).order_by()
+        genres = Title.genre.through.objects.filter(
+            title__in=titles
+        ).values_list('genre__slug', 'genre__name').annotate(
+            count=Count('title_id')
+        ).order_by('-count', 'genre__slug')
+        categories = titles.filter(category__isnull=False).values_list(
+            'category__slug', 'category__name'
+        ).annotate(count=Count('id')).order_by('-count', 'category__slug')
+        return {
+            'count': titles.count(),
+            'genre': [
+                {'slug': slug, 'name': name, 'count': count}
+                for slug, name, count in genres
+            ],
+            'category': [
+                {'slug': slug, 'name': name, 'count': count}
+                for slug, name, count in categories
+            ],
+            'year': list(titles.values('year').annotate(
+                count=Count('id')
+            ).order_by('-year')),
+        }
+
+    def shift_rating(self, score_delta, count_delta):
+        """
+        Атомарно сдвигает сумму оценок и число отзывов
+        и пересчитывает рейтинг одним UPDATE без чтения отзывов.
+        """
+        score_sum = F('score_sum') + score_delta
+        review_count = F('review_count') + count_delta
+        return self.update(
+            score_sum=score_sum,
+            review_count=review_count,
+            rating=score_sum / NullIf(review_count, 0),
+            weighted_rating=ExpressionWrapper(
+                weighted_rating(score_sum, review_count),
+                output_field=FloatField()
+            ),
+        )
+
+    def recompute_rating(self):
+        """
+        Пересчитывает рейтинг выбранных произведений по их отзывам
+        одним UPDATE с агрегирующими подзапросами.
+        """
+        reviews = Review.objects.filter(
+            title=OuterRef('pk')
+        ).order_by().values('title')
+        score_sum = Coalesce(Subquery(
+            reviews.annotate(total=Sum('score')).values('total')
+        ), 0)
+        review_count = Coalesce(Subquery(
+            reviews.annotate(count=Count('id')).values('count')
+        ), 0)
+        return self.update(
+            score_sum=score_sum,
+            review_count=review_count,
+            rating=Subquery(reviews.annotate(
+                average=Sum('score') / Count('id')
+            ).values('average')),
+            weighted_rating=ExpressionWrapper(
+                weighted_rating(score_sum, review_count),
+                output_field=FloatField()
+            ),
+        )
+
+
+class Title(NormalizedNameModel):
     """Модель произведения."""
+    RATING_FIELDS = (
+        'rating', 'score_sum', 'review_count', 'weighted_rating'
+    )
+
     name = models.CharField(max_length=TITLE_NAME_MAX_LENGHT)
     year = models.PositiveSmallIntegerField()
     rating = models.PositiveSmallIntegerField(null=True, blank=True)
+    score_sum = models.PositiveIntegerField(default=0, editable=False)
+    review_count = models.PositiveIntegerField(default=0, editable=False)
+    weighted_rating = models.FloatField(
+        default=WEIGHTED_RATING_PRIOR_SCORE, editable=False
+    )
     description = models.TextField(blank=True)
     genre = models.ManyToManyField('Genre', related_name='titles')
     category = models.ForeignKey(
@@ -26,15 +220,44 @@ class Title(models.Model):
         blank=True
     )
 
+    objects = TitleQuerySet.as_manager()
+
     class Meta:
         verbose_name = 'Произведение'
         verbose_name_plural = 'Произведения'
+        ordering = ('id',)
+        indexes = (
+            models.Index(fields=('rating', 'id'), name='title_rating_idx'),
+            models.Index(
+                fields=('weighted_rating', 'id'),
+                name='title_weighted_rating_idx'
+            ),
+            models.Index(fields=('year', 'id'), name='title_year_idx'),
+            models.Index(
+                fields=('category', 'year', 'id'),
+                name='title_category_year_idx'
+            ),
+            models.Index(fields=('name', 'id'), name='title_name_idx'),
+        )
 
     def __str__(self):
         return self.name
 
+    def save(self, *args, **kwargs):
+        """
+        Не перезаписываем поля рейтинга при изменении произведения:
+        их обновляют только атомарные сдвиги из отзывов.
+        """
+        if not self._state.adding and kwargs.get('update_fields') is None:
+            kwargs['update_fields'] = [
+                field.name for field in self._meta.concrete_fields
+                if not field.primary_key
+                and field.name not in self.RATING_FIELDS
+            ]
+        super().save(*args, **kwargs)
+
 
-class Category(models.Model):
+class Category(NormalizedNameModel):
     """Модель категории произведения."""
     name = models.CharField(max_length=CATEGORY_NAME_MAX_LENGHT)
     slug = models.SlugField(unique=True)
@@ -47,7 +270,7 @@ class Category(models.Model):
         return self.name
 
 
-class Genre(models.Model):
+class Genre(NormalizedNameModel):
     """Модель жанра произведения."""
     name = models.CharField(max_length=GENRE_NAME_MAX_LENGHT)
     slug = models.SlugField(unique=True)
@@ -76,8 +299,8 @@ class Review(models.Model):
     )
     score = models.PositiveIntegerField(
         validators=[
-            MinValueValidator(1),
-            MaxValueValidator(10)
+            MinValueValidator(SCORE_MIN),
+            MaxValueValidator(SCORE_MAX)
         ]
     )
     pub_date = models.DateTimeField(auto_now_add=True)
@@ -87,28 +310,160 @@ class Review(models.Model):
         verbose_name = "Отзыв"
         verbose_name_plural = "Отзывы"
         unique_together = ('author', 'title')
+        indexes = (
+            models.Index(
+                fields=('title', 'pub_date', 'id'),
+                name='review_title_pub_date_idx'
+            ),
+        )
 
     def save(self, *args, **kwargs):
-        """Переопределяем save для пересчета рейтинга при добавлении отзыва."""
-        super().save(*args, **kwargs)
-        self.update_title_rating()
+        """
+        Переопределяем save для инкрементального пересчета рейтинга:
+        новый отзыв добавляет оценку, изменение оценки сдвигает сумму.
+        Внутри deferred_rating_updates пересчет откладывается до коммита.
+        """
+        with transaction.atomic():
+            if defer_rating_update(self.title_id):
+                return super().save(*args, **kwargs)
+            old_score = None
+            if not self._state.adding:
+                old_score = Review.objects.select_for_update().filter(
+                    pk=self.pk
+                ).values_list('score', flat=True).first()
+            super().save(*args, **kwargs)
+            self.shift_title_rating(old_score, self.score)
 
     def delete(self, *args, **kwargs):
-        """Переопределяем delete для пересчета рейтинга при удалении отзыва."""
-        title = self.title
-        super().delete(*args, **kwargs)
-        title.save()
-
-    def update_title_rating(self):
-        """Пересчитывает рейтинг для связанного произведения."""
-        title = self.title
-        reviews = title.reviews.all()
-        scores = [review.score for review in reviews]
-        if scores:
-            title.rating = sum(scores) // len(scores)
-        else:
-            title.rating = None
-        title.save()
+        """
+        Переопределяем delete для вычитания оценки из рейтинга.
+        Вычитается сохраненная оценка, а не загруженная в объект:
+        ее могли изменить, пока объект был в памяти.
+        """
+        with transaction.atomic():
+            if defer_rating_update(self.title_id):
+                return super().delete(*args, **kwargs)
+            old_score = Review.objects.select_for_update().filter(
+                pk=self.pk
+            ).values_list('score', flat=True).first()
+            result = super().delete(*args, **kwargs)
+            if old_score is not None:
+                self.shift_title_rating(old_score, None)
+        return result
+
+    def shift_title_rating(self, old_score, new_score):
+        """
+        Переносит отзыв из старой оценки в новую в счетчиках
+        рейтинга и гистограмме оценок произведения.
+        """
+        if old_score == new_score:
+            return
+        deltas = Counter()
+        if old_score is not None:
+            deltas[old_score] -= 1
+        if new_score is not None:
+            deltas[new_score] += 1
+        Title.objects.filter(pk=self.title_id).shift_rating(
+            (new_score or 0) - (old_score or 0), sum(deltas.values())
+        )
+        ScoreDistribution.objects.shift_scores(self.title_id, deltas)
+        notify_rating_changed((self.title_id,))
+
+
+class ScoreDistributionQuerySet(models.QuerySet):
+
+    def shift_scores(self, title_id, deltas):
+        """
+        Атомарно сдвигает счетчики оценок произведения одним UPDATE.
+        Строка гистограммы создается при первом отзыве.
+        """
+        changes = {
+            ScoreDistribution.field_name(score): F(
+                ScoreDistribution.field_name(score)
+            ) + delta
+            for score, delta in deltas.items() if delta
+        }
+        if not changes or self.filter(title_id=title_id).update(**changes):
+            return
+        try:
+            with transaction.atomic():
+                self.create(title_id=title_id, **{
+                    ScoreDistribution.field_name(score): delta
+                    for score, delta in deltas.items() if delta > 0
+                })
+        except IntegrityError:
+            self.filter(title_id=title_id).update(**changes)
+
+    def rebuild(self, title_ids):
+        """
+        Пересчитывает гистограммы произведений по отзывам одним UPDATE
+        с коррелированными подзапросами, как recompute_rating: счетчики
+        читаются и записываются одним запросом, поэтому параллельный
+        shift_scores не теряется. Недостающие строки создаются заранее.
+        """
+        title_ids = list(
+            Title.objects.filter(pk__in=title_ids).values_list('pk', flat=True)
+        )
+        reviews = Review.objects.filter(
+            title=OuterRef('title_id')
+        ).order_by().values('title')
+        with transaction.atomic():
+            existing = set(self.filter(title_id__in=title_ids).values_list(
+                'title_id', flat=True
+            ))
+            self.bulk_create(
+                (ScoreDistribution(title_id=title_id)
+                 for title_id in title_ids if title_id not in existing),
+                ignore_conflicts=True
+            )
+            return self.filter(title_id__in=title_ids).update(**{
+                ScoreDistribution.field_name(score): Coalesce(Subquery(
+                    reviews.filter(score=score).annotate(
+                        count=Count('id')
+                    ).values('count')
+                ), 0)
+                for score in range(SCORE_MIN, SCORE_MAX + 1)
+            })
+
+
+class ScoreDistribution(models.Model):
+    """Гистограмма оценок произведения, обновляемая при записи отзывов."""
+    title = models.OneToOneField(
+        Title,
+        on_delete=models.CASCADE,
+        primary_key=True,
+        related_name='score_distribution'
+    )
+    score_1 = models.PositiveIntegerField(default=0)
+    score_2 = models.PositiveIntegerField(default=0)
+    score_3 = models.PositiveIntegerField(default=0)
+    score_4 = models.PositiveIntegerField(default=0)
+    score_5 = models.PositiveIntegerField(default=0)
+    score_6 = models.PositiveIntegerField(default=0)
+    score_7 = models.PositiveIntegerField(default=0)
+    score_8 = models.PositiveIntegerField(default=0)
+    score_9 = models.PositiveIntegerField(default=0)
+    score_10 = models.PositiveIntegerField(default=0)
+
+    objects = ScoreDistributionQuerySet.as_manager()
+
+    class Meta:
+        verbose_name = 'Распределение оценок'
+        verbose_name_plural = 'Распределения оценок'
+
+    def __str__(self):
+        return f'Распределение оценок: {self.title_id}'
+
+    @staticmethod
+    def field_name(score):
+        return f'score_{score}'
+
+    def counts(self):
+        """Возвращает пары (оценка, количество отзывов) по возрастанию."""
+        return [
+            (score, getattr(self, self.field_name(score)))
+            for score in range(SCORE_MIN, SCORE_MAX + 1)
+        ]
 
 
 class Comment(models.Model):
@@ -128,8 +483,15 @@ class Comment(models.Model):
     pub_date = models.DateTimeField(auto_now_add=True)
 
     class Meta:
+        ordering = ('pub_date', 'id')
         verbose_name = "Комментарий"
         verbose_name_plural = "Комментарии"
+        indexes = (
+            models.Index(
+                fields=('review', 'pub_date', 'id'),
+                name='comment_review_pub_date_idx'
+            ),
+        )
 
     def __str__(self):
         return self.text
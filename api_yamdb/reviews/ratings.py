@@ -0,0 +1,120 @@
+import threading
+from contextlib import contextmanager
+
+from django.apps import apps
+from django.db import transaction
+from django.dispatch import Signal
+
+from reviews.constants import RATING_RECOMPUTE_BATCH_SIZE
+
+_state = threading.local()
+
+# Отправляется после коммита, когда у произведений title_ids
+# изменился рейтинг.
+rating_changed = Signal()
+
+
+def _pending():
+    """Множество произведений, ожидающих пересчета в текущем потоке."""
+    return getattr(_state, 'pending', None)
+
+
+def _scheduled():
+    """
+    Произведения, пересчет которых уже запланирован на коммит текущей
+    транзакции, или None. После коммита или отката Django убирает
+    обработчик из run_on_commit, и множество перестает действовать.
+    """
+    scheduled = getattr(_state, 'scheduled', None)
+    if scheduled is None:
+        return None
+    title_ids, callback = scheduled
+    connection = transaction.get_connection()
+    if any(entry[1] is callback for entry in connection.run_on_commit):
+        return title_ids
+    return None
+
+
+def recompute_ratings(title_ids):
+    """
+    Пересчитывает рейтинг и гистограмму оценок произведений по отзывам
+    пачками по RATING_RECOMPUTE_BATCH_SIZE произведений.
+    """
+    Title = apps.get_model('reviews', 'Title')
+    ScoreDistribution = apps.get_model('reviews', 'ScoreDistribution')
+    title_ids = list(title_ids)
+    updated = 0
+    for start in range(0, len(title_ids), RATING_RECOMPUTE_BATCH_SIZE):
+        batch = title_ids[start:start + RATING_RECOMPUTE_BATCH_SIZE]
+        updated += Title.objects.filter(pk__in=batch).recompute_rating()
+        ScoreDistribution.objects.rebuild(batch)
+    notify_rating_changed(title_ids)
+    return updated
+
+
+def notify_rating_changed(title_ids):
+    """Отправляет rating_changed после коммита текущей транзакции."""
+    title_ids = frozenset(title_ids)
+    if title_ids:
+        transaction.on_commit(lambda: rating_changed.send(
+            sender=None, title_ids=title_ids
+        ))
+
+
+def schedule_rating_recompute(title_ids):
+    """
+    Пересчитывает рейтинг произведений после коммита текущей транзакции.
+    Вызовы в одной транзакции, например pre_delete каждого пользователя
+    при удалении queryset, сливаются в один пересчет. Внутри
+    deferred_rating_updates присоединяет их к общему пересчету.
+    """
+    pending = _pending()
+    if pending is None:
+        pending = _scheduled()
+    if pending is not None:
+        pending.update(title_ids)
+        return
+    title_ids = set(title_ids)
+    if not title_ids:
+        return
+
+    def recompute():
+        recompute_ratings(title_ids)
+
+    _state.scheduled = (title_ids, recompute)
+    transaction.on_commit(recompute)
+
+
+def defer_rating_update(title_id):
+    """
+    Откладывает пересчет рейтинга произведения, если код выполняется
+    внутри deferred_rating_updates. Возвращает True, если пересчет отложен.
+    """
+    pending = _pending()
+    if pending is None:
+        return False
+    pending.add(title_id)
+    return True
+
+
+@contextmanager
+def deferred_rating_updates():
+    """
+    Контекстный менеджер для массовых операций с отзывами.
+
+    Оборачивает работу в транзакцию, собирает затронутые произведения
+    и после коммита пересчитывает рейтинг каждого из них один раз.
+    Вложенные блоки присоединяются к внешнему.
+    """
+    if _pending() is not None:
+        yield
+        return
+    _state.pending = set()
+    try:
+        with transaction.atomic():
+            yield
+            title_ids = frozenset(_state.pending)
+            if title_ids:
+                transaction.on_commit(lambda: recompute_ratings(title_ids))
+    finally:
+        _state.pending = None
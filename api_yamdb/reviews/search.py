@@ -0,0 +1,172 @@
+import re
+from functools import lru_cache
+
+from django.apps import apps
+from django.conf import settings
+from django.db import connection
+from django.db.models import FloatField, Q, Value
+from django.db.models.expressions import RawSQL
+from django.dispatch import Signal
+from django.utils.module_loading import import_string
+
+SEARCH_INDEX_TABLE = 'reviews_title_fts'
+# Триграммный индекс нормализованных названий для ?name=: подстрока
+# ищется по индексу, если в ней не меньше трех символов.
+NAME_INDEX_TABLE = 'reviews_title_name_fts'
+NAME_INDEX_MIN_LENGTH = 3
+SEARCH_INDEX_BATCH_SIZE = 500
+# Вес совпадений в названии и в описании при ранжировании.
+NAME_WEIGHT = 10.0
+DESCRIPTION_WEIGHT = 1.0
+
+# Отправляется после перестроения индекса: результаты поиска
+# могли измениться у любых произведений.
+search_index_rebuilt = Signal()
+
+
+def normalize_text(text):
+    """Приводит текст к виду для поиска: без регистра, ё как е."""
+    return text.casefold().replace('ё', 'е')
+
+
+def search_terms(query):
+    return re.findall(r'\w+', normalize_text(query))
+
+
+class SearchBackend:
+    """
+    Поиск произведений без индекса: каждое слово запроса ищется
+    подстрокой в названии или описании. Все совпадения равнозначны.
+    Подходит для СУБД без FTS5.
+    """
+
+    def search(self, queryset, query):
+        """
+        Оставляет произведения, подходящие под запрос,
+        и аннотирует их полем search_rank: чем меньше, тем выше.
+        """
+        for term in search_terms(query):
+            queryset = queryset.filter(
+                Q(name__icontains=term) | Q(description__icontains=term)
+            )
+        return queryset.annotate(
+            search_rank=Value(0.0, output_field=FloatField())
+        )
+
+    def filter_name(self, queryset, text):
+        """Произведения, в названии которых есть подстрока text."""
+        return queryset.filter(normalized_name__contains=normalize_text(text))
+
+    def index_titles(self, titles):
+        """Добавляет или обновляет произведения в индексе."""
+
+    def remove_titles(self, title_ids):
+        """Удаляет произведения из индекса."""
+
+    def rebuild(self):
+        """Строит индекс заново и возвращает число проиндексированных."""
+        return 0
+
+
+class FTS5SearchBackend(SearchBackend):
+    """
+    Полнотекстовый поиск по виртуальной таблице SQLite FTS5,
+    rowid которой совпадает с id произведения. Текст хранится
+    нормализованным, слова запроса ищутся по префиксу,
+    результаты ранжируются по bm25 с перевесом названия.
+    Подстроки названий ищутся по второй таблице с токенизатором trigram.
+    """
+
+    def search(self, queryset, query):
+        terms = search_terms(query)
+        if not terms:
+            # Запрос из одних знаков препинания: ничего не найдено,
+            # но сортировка по search_rank должна оставаться возможной.
+            return queryset.none().annotate(
+                search_rank=Value(0.0, output_field=FloatField())
+            )
+        match = ' '.join(f'"{term}"*' for term in terms)
+        title_table = queryset.model._meta.db_table
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {SEARCH_INDEX_TABLE} '
+            f'WHERE {SEARCH_INDEX_TABLE} MATCH %s',
+            (match,)
+        )).annotate(search_rank=RawSQL(
+            f'SELECT bm25({SEARCH_INDEX_TABLE}, %s, %s) '
+            f'FROM {SEARCH_INDEX_TABLE} '
+            f'WHERE {SEARCH_INDEX_TABLE} MATCH %s '
+            f'AND rowid = "{title_table}"."id"',
+            (NAME_WEIGHT, DESCRIPTION_WEIGHT, match),
+            output_field=FloatField()
+        ))
+
+    def filter_name(self, queryset, text):
+        text = normalize_text(text)
+        if len(text) < NAME_INDEX_MIN_LENGTH:
+            # Короче триграммы индекс не поможет.
+            return super().filter_name(queryset, text)
+        pattern = re.sub(r'([*?[])', r'[\1]', text)
+        return queryset.filter(pk__in=RawSQL(
+            f'SELECT rowid FROM {NAME_INDEX_TABLE} WHERE name GLOB %s',
+            (f'*{pattern}*',)
+        ))
+
+    def index_titles(self, titles):
+        titles = list(titles)
+        self.remove_titles([title.pk for title in titles])
+        self.insert_titles(titles)
+
+    @staticmethod
+    def insert_titles(titles):
+        rows = [
+            (title.pk, normalize_text(title.name),
+             normalize_text(title.description))
+            for title in titles
+        ]
+        with connection.cursor() as cursor:
+            cursor.executemany(
+                f'INSERT INTO {SEARCH_INDEX_TABLE} '
+                f'(rowid, name, description) VALUES (%s, %s, %s)',
+                rows
+            )
+            cursor.executemany(
+                f'INSERT INTO {NAME_INDEX_TABLE} (rowid, name) '
+                f'VALUES (%s, %s)',
+                [row[:2] for row in rows]
+            )
+
+    def remove_titles(self, title_ids):
+        title_ids = list(title_ids)
+        if not title_ids:
+            return
+        placeholders = ', '.join(['%s'] * len(title_ids))
+        with connection.cursor() as cursor:
+            for table in (SEARCH_INDEX_TABLE, NAME_INDEX_TABLE):
+                cursor.execute(
+                    f'DELETE FROM {table} WHERE rowid IN ({placeholders})',
+                    title_ids
+                )
+
+    def rebuild(self):
+        Title = apps.get_model('reviews', 'Title')
+        with connection.cursor() as cursor:
+            for table in (SEARCH_INDEX_TABLE, NAME_INDEX_TABLE):
+                cursor.execute(f'DELETE FROM {table}')
+        batch = []
+        count = 0
+        for title in Title.objects.only(
+            'name', 'description'
+        ).iterator(SEARCH_INDEX_BATCH_SIZE):
+            batch.append(title)
+            if len(batch) >= SEARCH_INDEX_BATCH_SIZE:
+                self.insert_titles(batch)
+                count += len(batch)
+                batch = []
+        self.insert_titles(batch)
+        return count + len(batch)
+
+
+@lru_cache(maxsize=None)
+def get_search_backend():
+    """Бэкенд поиска из настройки TITLE_SEARCH_BACKEND."""
+    return import_string(settings.TITLE_SEARCH_BACKEND)()
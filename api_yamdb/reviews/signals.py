@@ -1,21 +1,160 @@
-from django.db.models.signals import post_delete, post_save
+from django.contrib.auth import get_user_model
+from django.db import DatabaseError, transaction
+from django.db.models.signals import (
+    m2m_changed, post_delete, post_save, pre_delete, pre_save
+)
 from django.dispatch import receiver
 
-from reviews.models import Review
+from reviews import autocomplete, leaderboards
+from reviews.models import (
+    Category, Genre, Review, Title, titles_bulk_changed, titles_bulk_delete
+)
+from reviews.ratings import rating_changed, schedule_rating_recompute
+from reviews.search import get_search_backend
 
+User = get_user_model()
 
-@receiver((post_save, post_delete), sender=Review)
-def update_rating(sender, instance, **kwargs):
+
+@receiver(pre_delete, sender=User)
+def recompute_author_titles_rating(sender, instance, **kwargs):
+    """
+    Каскадное удаление отзывов пользователя идет в обход Review.delete.
+    Запоминаем затронутые произведения и пересчитываем их рейтинг
+    после коммита одним запросом, а не по каждому отзыву. При удалении
+    нескольких пользователей в одной транзакции пересчет общий.
+    Произведения, удаленные в той же транзакции, пересчет пропускает.
+    """
+    schedule_rating_recompute(
+        Review.objects.filter(author=instance).order_by().values_list(
+            'title_id', flat=True
+        ).distinct()
+    )
+
+
+@receiver(rating_changed)
+def refresh_leaderboards(sender, title_ids, **kwargs):
+    """
+    Переносит произведения с новым рейтингом в рейтинг-листах.
+    Сигнал приходит уже после коммита, поэтому ошибка БД здесь
+    не должна провалить запрос: листы просто собираются заново.
+    """
+    try:
+        leaderboards.refresh_titles(title_ids)
+    except DatabaseError:
+        leaderboards.invalidate_all()
+
+
+@receiver(pre_save, sender=Title)
+def remember_title_category(sender, instance, **kwargs):
+    """Запоминает прежнюю категорию оцененного произведения."""
+    instance._previous_category_id = instance.category_id
+    if instance.pk is not None and instance.rating is not None:
+        instance._previous_category_id = Title.objects.filter(
+            pk=instance.pk
+        ).values_list('category_id', flat=True).first()
+
+
+@receiver(post_save, sender=Title)
+def invalidate_leaderboards_on_category_change(sender, instance, **kwargs):
+    """
+    Смена категории оцененного произведения сбрасывает листы прежней
+    и новой категорий. Правки остальных полей листы не затрагивают.
+    """
+    previous = getattr(
+        instance, '_previous_category_id', instance.category_id
+    )
+    if instance.rating is None or previous == instance.category_id:
+        return
+    for category_id in (previous, instance.category_id):
+        if category_id is not None:
+            leaderboards.invalidate_group(leaderboards.CATEGORY, category_id)
+
+
+@receiver(post_delete, sender=Title)
+def invalidate_leaderboards_on_title_delete(sender, instance, **kwargs):
+    """Удаленное оцененное произведение убирается из всех листов."""
+    if instance.rating is not None:
+        leaderboards.invalidate_all()
+
+
+@receiver(m2m_changed, sender=Title.genre.through)
+def invalidate_leaderboards_on_genre_change(sender, instance, action,
+                                            reverse, **kwargs):
+    """
+    Смена жанров у оцененных произведений сбрасывает рейтинг-листы.
+    Жанры нового произведения без отзывов листы не затрагивают.
     """
-    Пересчитывает рейтинг произведения
-    при добавлении, изменении или удалении отзыва.
+    if action not in ('post_add', 'post_remove', 'post_clear'):
+        return
+    if reverse or instance.rating is not None:
+        leaderboards.invalidate_all()
+
+
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Category)
+def invalidate_leaderboards_on_group_delete(sender, instance, **kwargs):
+    """Листы удаленной группы не должны достаться новой с тем же id."""
+    leaderboards.invalidate_all()
+
+
+@receiver(post_save, sender=Title)
+def index_title(sender, instance, **kwargs):
+    """Поисковый индекс обновляется в той же транзакции, что и произведение."""
+    get_search_backend().index_titles((instance,))
+
+
+@receiver(post_delete, sender=Title)
+def unindex_title(sender, instance, **kwargs):
+    get_search_backend().remove_titles((instance.pk,))
+
+
+@receiver(titles_bulk_changed)
+def refresh_bulk_changed_titles(sender, title_ids, **kwargs):
+    """
+    Массовая запись идет в обход post_save: индекс поиска обновляется
+    в той же транзакции, подсказки перестраиваются после коммита,
+    рейтинг-листы сбрасываются, если среди произведений есть оцененные.
     """
-    title = instance.title
-    reviews = title.reviews.all()
-    scores = [review.score for review in reviews]
+    titles = list(Title.objects.filter(pk__in=title_ids).only(
+        'name', 'description', 'rating'
+    ))
+    get_search_backend().index_titles(titles)
+    if any(title.rating is not None for title in titles):
+        leaderboards.invalidate_all()
+    transaction.on_commit(autocomplete.invalidate)
+
+
+@receiver(titles_bulk_delete)
+def unindex_bulk_deleted_titles(sender, title_ids, **kwargs):
+    """
+    Массовое удаление идет в обход post_delete: произведения уходят
+    из индекса поиска одним запросом, подсказки и рейтинг-листы,
+    если среди произведений есть оцененные, сбрасываются после коммита.
+    """
+    get_search_backend().remove_titles(title_ids)
+    if Title.objects.filter(pk__in=title_ids, rating__isnull=False).exists():
+        transaction.on_commit(leaderboards.invalidate_all)
+    transaction.on_commit(autocomplete.invalidate)
+
+
+AUTOCOMPLETE_KINDS = {
+    Title: autocomplete.TITLE,
+    Genre: autocomplete.GENRE,
+    Category: autocomplete.CATEGORY,
+}
+
+
+@receiver(post_save, sender=Title)
+@receiver(post_save, sender=Genre)
+@receiver(post_save, sender=Category)
+def update_autocomplete(sender, instance, **kwargs):
+    kind = AUTOCOMPLETE_KINDS[sender]
+    transaction.on_commit(lambda: autocomplete.update(kind, instance))
+
 
-    if scores:
-        title.rating = sum(scores) // len(scores)
-    else:
-        title.rating = None
-    title.save()
+@receiver(post_delete, sender=Title)
+@receiver(post_delete, sender=Genre)
+@receiver(post_delete, sender=Category)
+def remove_from_autocomplete(sender, instance, **kwargs):
+    kind, pk = AUTOCOMPLETE_KINDS[sender], instance.pk
+    transaction.on_commit(lambda: autocomplete.remove(kind, pk))
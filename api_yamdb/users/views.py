@@ -54,6 +54,7 @@ class UserViewSet(viewsets.ModelViewSet):
     filter_backends = (filters.SearchFilter,)
     lookup_field = 'username'
     http_method_names = ['get', 'post', 'delete', 'patch']
+    cursor_ordering = ('id',)
 
     @action(
         methods=['patch', 'get'],
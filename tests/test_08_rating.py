@@ -0,0 +1,484 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.cache import cache
+from django.core.management import CommandError, call_command
+
+from reviews import leaderboards, ratings
+from reviews.models import Review, ScoreDistribution, Title
+from reviews.ratings import deferred_rating_updates
+from tests.utils import create_single_review, create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test08RatingAPI:
+
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+    REVIEW_DETAIL_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/reviews/{review_id}/'
+    )
+    DISTRIBUTION_URL_TEMPLATE = (
+        '/api/v1/titles/{title_id}/rating-distribution/'
+    )
+
+    def get_rating(self, client, title_id):
+        response = client.get(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=title_id)
+        )
+        assert response.status_code == HTTPStatus.OK
+        return response.json().get('rating')
+
+    def test_01_rating_follows_review_changes(self, admin_client,
+                                              user_client, moderator_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        review = create_single_review(
+            user_client, title_id, 'Отзыв пользователя', 3
+        ).json()
+        create_single_review(
+            moderator_client, title_id, 'Отзыв модератора', 8
+        )
+        assert self.get_rating(admin_client, title_id) == 5, (
+            'Проверьте, что рейтинг произведения равен средней оценке '
+            'его отзывов.'
+        )
+
+        url = self.REVIEW_DETAIL_URL_TEMPLATE.format(
+            title_id=title_id, review_id=review['id']
+        )
+        response = user_client.patch(url, data={'score': 10})
+        assert response.status_code == HTTPStatus.OK
+        assert self.get_rating(admin_client, title_id) == 9, (
+            'Проверьте, что рейтинг произведения пересчитывается '
+            'при изменении оценки в отзыве.'
+        )
+
+        response = user_client.delete(url)
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert self.get_rating(admin_client, title_id) == 8, (
+            'Проверьте, что рейтинг произведения пересчитывается '
+            'при удалении отзыва.'
+        )
+
+    def test_02_rating_reset_without_reviews(self, admin_client,
+                                             user_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        review = create_single_review(
+            user_client, title_id, 'Единственный отзыв', 7
+        ).json()
+        user_client.delete(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=title_id, review_id=review['id']
+            )
+        )
+        assert self.get_rating(admin_client, title_id) is None, (
+            'Проверьте, что после удаления всех отзывов рейтинг '
+            'произведения становится `None`.'
+        )
+
+    def test_03_parallel_reviews_keep_rating(self):
+        out = StringIO()
+        call_command(
+            'stress_reviews', writers=6, reviews=60, min_throughput=20,
+            stdout=out
+        )
+        assert 'Рейтинг согласован' in out.getvalue(), (
+            'Проверьте, что при параллельном создании отзывов и правке '
+            'произведения рейтинг остается согласованным с отзывами.'
+        )
+        with pytest.raises(CommandError, match='Пропускная способность'):
+            call_command(
+                'stress_reviews', writers=2, reviews=10,
+                min_throughput=10 ** 9, stdout=StringIO()
+            )
+
+    def test_04_deferred_rating_updates(self, django_user_model):
+        title = Title.objects.create(name='Отложенный рейтинг', year=2000)
+        authors = [
+            django_user_model.objects.create_user(
+                username=f'deferred{idx}', email=f'deferred{idx}@yamdb.fake'
+            )
+            for idx in range(4)
+        ]
+        with deferred_rating_updates():
+            for score, author in enumerate(authors, 3):
+                Review.objects.create(
+                    title=title, author=author, text='Отзыв', score=score
+                )
+            title.refresh_from_db()
+            assert title.review_count == 0, (
+                'Проверьте, что внутри `deferred_rating_updates` рейтинг '
+                'не пересчитывается после каждого отзыва.'
+            )
+        title.refresh_from_db()
+        assert (title.score_sum, title.review_count, title.rating) == (
+            18, 4, 4
+        ), (
+            'Проверьте, что после выхода из `deferred_rating_updates` '
+            'рейтинг произведения пересчитывается по всем отзывам.'
+        )
+
+    def test_05_rating_after_author_delete(self, admin_client, user,
+                                           user_client, moderator_client):
+        titles, _, _ = create_titles(admin_client)
+        for title in titles:
+            create_single_review(user_client, title['id'], 'Отзыв', 10)
+        create_single_review(moderator_client, titles[0]['id'], 'Отзыв', 4)
+
+        response = admin_client.delete(f'/api/v1/users/{user.username}/')
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        assert self.get_rating(admin_client, titles[0]['id']) == 4, (
+            'Проверьте, что при удалении пользователя рейтинг произведений '
+            'пересчитывается без его отзывов.'
+        )
+        assert self.get_rating(admin_client, titles[1]['id']) is None, (
+            'Проверьте, что при удалении пользователя рейтинг произведений, '
+            'у которых не осталось отзывов, становится `None`.'
+        )
+
+    def test_06_rebuild_ratings_command(self, admin_client, user_client):
+        titles, _, _ = create_titles(admin_client)
+        for title in titles:
+            create_single_review(user_client, title['id'], 'Отзыв', 6)
+        Title.objects.filter(pk=titles[0]['id']).update(
+            score_sum=1, review_count=3, rating=1
+        )
+        ScoreDistribution.objects.filter(title_id=titles[1]['id']).update(
+            score_6=0, score_2=1
+        )
+
+        with pytest.raises(CommandError):
+            call_command('rebuild_ratings', verify=True, stdout=StringIO())
+        assert self.get_rating(admin_client, titles[0]['id']) == 1, (
+            'Проверьте, что команда `rebuild_ratings --verify` '
+            'не изменяет рейтинг произведений.'
+        )
+
+        out = StringIO()
+        call_command('rebuild_ratings', titles=[titles[0]['id']], stdout=out)
+        assert 'Исправлено расхождений рейтинга: 1,' in out.getvalue()
+        assert self.get_rating(admin_client, titles[0]['id']) == 6, (
+            'Проверьте, что команда `rebuild_ratings` пересчитывает '
+            'рейтинг произведений по отзывам.'
+        )
+        out = StringIO()
+        call_command('rebuild_ratings', stdout=out)
+        assert (
+            'Исправлено расхождений рейтинга: 0, гистограмм оценок: 1'
+        ) in out.getvalue(), (
+            'Проверьте, что команда `rebuild_ratings` находит и '
+            'исправляет только расходящиеся гистограммы оценок.'
+        )
+        distribution = ScoreDistribution.objects.get(title_id=titles[1]['id'])
+        assert (distribution.score_2, distribution.score_6) == (0, 1)
+        call_command('rebuild_ratings', verify=True, stdout=StringIO())
+
+    def test_07_rating_distribution(self, client, admin_client, user_client,
+                                    moderator_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        review = create_single_review(
+            user_client, title_id, 'Отзыв', 3
+        ).json()
+        create_single_review(moderator_client, title_id, 'Отзыв', 9)
+        user_client.patch(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=title_id, review_id=review['id']
+            ),
+            data={'score': 9}
+        )
+
+        url = self.DISTRIBUTION_URL_TEMPLATE.format(title_id=title_id)
+        response = client.get(url)
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос неавторизованного пользователя к '
+            f'`{self.DISTRIBUTION_URL_TEMPLATE}` возвращает ответ со '
+            'статусом 200.'
+        )
+        data = response.json()
+        counts = {row['score']: row['count'] for row in data['distribution']}
+        assert data['review_count'] == 2 and counts == {
+            score: 2 if score == 9 else 0 for score in range(1, 11)
+        }, (
+            f'Проверьте, что ответ на GET-запрос к '
+            f'`{self.DISTRIBUTION_URL_TEMPLATE}` содержит количество '
+            'отзывов для каждой оценки от 1 до 10.'
+        )
+
+        response = client.get(
+            self.DISTRIBUTION_URL_TEMPLATE.format(title_id=titles[1]['id'])
+        )
+        assert response.json()['review_count'] == 0
+
+        ScoreDistribution.objects.filter(title_id=title_id).update(
+            score_1=5, score_9=0
+        )
+        ScoreDistribution.objects.rebuild([title_id, titles[1]['id']])
+        distribution = ScoreDistribution.objects.get(title_id=title_id)
+        assert (distribution.score_1, distribution.score_9) == (0, 2), (
+            'Проверьте, что ScoreDistribution.objects.rebuild пересчитывает '
+            'гистограмму по отзывам.'
+        )
+        assert ScoreDistribution.objects.get(
+            title_id=titles[1]['id']
+        ).counts() == [(score, 0) for score in range(1, 11)]
+        response = client.get(
+            self.DISTRIBUTION_URL_TEMPLATE.format(title_id=10 ** 6)
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND
+        response = client.get(
+            self.DISTRIBUTION_URL_TEMPLATE.format(title_id='abc')
+        )
+        assert response.status_code == HTTPStatus.NOT_FOUND, (
+            f'Проверьте, что GET-запрос к `{self.DISTRIBUTION_URL_TEMPLATE}` '
+            'с нечисловым id возвращает ответ со статусом 404.'
+        )
+
+    def test_08_titles_ordering_by_rating(self, client, admin_client,
+                                          user_client, moderator_client):
+        titles, _, _ = create_titles(admin_client)
+        create_single_review(user_client, titles[0]['id'], 'Отзыв', 10)
+        for author_client in (admin_client, user_client, moderator_client):
+            create_single_review(
+                author_client, titles[1]['id'], 'Отзыв', 9
+            )
+
+        response = client.get('/api/v1/titles/?ordering=-rating')
+        assert response.status_code == HTTPStatus.OK
+        assert [title['id'] for title in response.json()['results']] == [
+            titles[0]['id'], titles[1]['id']
+        ], (
+            'Проверьте, что `/api/v1/titles/?ordering=-rating` возвращает '
+            'произведения по убыванию рейтинга.'
+        )
+
+        response = client.get('/api/v1/titles/?ordering=-weighted_rating')
+        assert [title['id'] for title in response.json()['results']] == [
+            titles[1]['id'], titles[0]['id']
+        ], (
+            'Проверьте, что взвешенный рейтинг ставит произведение с '
+            'несколькими отзывами выше произведения с одной высокой оценкой.'
+        )
+        assert Title.objects.get(pk=titles[1]['id']).weighted_rating == (
+            pytest.approx((27 + 55) / 13)
+        )
+
+    def test_09_top_titles_by_genre_and_category(self, client, admin_client,
+                                                 user_client):
+        titles, categories, genres = create_titles(admin_client)
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[1]['id']),
+            data={'genre': [genres[0]['slug']],
+                  'category': categories[0]['slug']},
+            format='json'
+        )
+        create_single_review(user_client, titles[0]['id'], 'Отзыв', 5)
+        review = create_single_review(
+            user_client, titles[1]['id'], 'Отзыв', 3
+        ).json()
+
+        for url in (f'/api/v1/genres/{genres[0]["slug"]}/top/',
+                    f'/api/v1/categories/{categories[0]["slug"]}/top/'):
+            response = client.get(url)
+            assert response.status_code == HTTPStatus.OK, (
+                f'Проверьте, что GET-запрос к `{url}` возвращает ответ со '
+                'статусом 200.'
+            )
+            assert [title['id'] for title in response.json()] == [
+                titles[0]['id'], titles[1]['id']
+            ], (
+                f'Проверьте, что `{url}` возвращает произведения по '
+                'убыванию рейтинга.'
+            )
+
+        user_client.patch(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=titles[1]['id'], review_id=review['id']
+            ),
+            data={'score': 9}
+        )
+        response = client.get(f'/api/v1/genres/{genres[0]["slug"]}/top/')
+        assert [title['id'] for title in response.json()] == [
+            titles[1]['id'], titles[0]['id']
+        ], (
+            'Проверьте, что список лучших произведений жанра обновляется '
+            'при изменении рейтинга.'
+        )
+        assert client.get('/api/v1/genres/unknown/top/').status_code == (
+            HTTPStatus.NOT_FOUND
+        )
+
+    def test_10_top_titles_cache_consistency(self, client, admin_client,
+                                             user_client, monkeypatch):
+        titles, categories, genres = create_titles(admin_client)
+        first_id, second_id = titles[0]['id'], titles[1]['id']
+        top_url = f'/api/v1/categories/{categories[0]["slug"]}/top/'
+        create_single_review(user_client, first_id, 'Отзыв', 5)
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=second_id),
+            data={'category': categories[0]['slug']}, format='json'
+        )
+        assert [title['id'] for title in client.get(top_url).json()] == [
+            first_id
+        ]
+
+        create_single_review(user_client, second_id, 'Отзыв', 3)
+        build = leaderboards._build
+
+        def build_then_rate(kind, group_id):
+            board = build(kind, group_id)
+            if kind == leaderboards.CATEGORY:
+                Review.objects.filter(title_id=second_id).update(score=9)
+                Title.objects.filter(pk=second_id).recompute_rating()
+                leaderboards.refresh_titles([second_id])
+            return board
+
+        monkeypatch.setattr(leaderboards, '_build', build_then_rate)
+        leaderboards.invalidate_group(
+            leaderboards.CATEGORY,
+            Title.objects.get(pk=second_id).category_id
+        )
+        assert [title['id'] for title in client.get(top_url).json()] == [
+            first_id, second_id
+        ]
+        monkeypatch.setattr(leaderboards, '_build', build)
+        assert [title['id'] for title in client.get(top_url).json()] == [
+            second_id, first_id
+        ], (
+            'Проверьте, что лист, собранный до изменения рейтинга, '
+            'не сохраняется в кэше вместо актуального.'
+        )
+
+        invalidated = []
+        monkeypatch.setattr(
+            leaderboards, 'invalidate_all', lambda: invalidated.append('all')
+        )
+        monkeypatch.setattr(
+            leaderboards, 'invalidate_group',
+            lambda kind, group_id: invalidated.append((kind, group_id))
+        )
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=first_id),
+            data={'description': 'Новое описание'}, format='json'
+        )
+        assert invalidated == [], (
+            'Проверьте, что изменение описания оцененного произведения '
+            'не сбрасывает рейтинг-листы.'
+        )
+        old_category_id = Title.objects.get(pk=first_id).category_id
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=first_id),
+            data={'category': categories[1]['slug']}, format='json'
+        )
+        assert invalidated == [
+            (leaderboards.CATEGORY, old_category_id),
+            (leaderboards.CATEGORY, Title.objects.get(pk=first_id).category_id),
+        ], (
+            'Проверьте, что смена категории сбрасывает листы только '
+            'прежней и новой категорий.'
+        )
+
+    def test_11_delete_stale_review(self, admin_client, user_client):
+        titles, _, _ = create_titles(admin_client)
+        title_id = titles[0]['id']
+        review_id = create_single_review(
+            user_client, title_id, 'Отзыв', 2
+        ).json()['id']
+        stale = Review.objects.get(pk=review_id)
+        stale_copy = Review.objects.get(pk=review_id)
+        user_client.patch(
+            self.REVIEW_DETAIL_URL_TEMPLATE.format(
+                title_id=title_id, review_id=review_id
+            ),
+            data={'score': 8}
+        )
+        stale.delete()
+        stale_copy.delete()
+        title = Title.objects.get(pk=title_id)
+        assert (title.score_sum, title.review_count, title.rating) == (
+            0, 0, None
+        ), (
+            'Проверьте, что удаление отзыва вычитает из рейтинга '
+            'сохраненную оценку, а не загруженную до ее изменения.'
+        )
+        assert sum(
+            count for _, count in ScoreDistribution.objects.get(
+                title_id=title_id
+            ).counts()
+        ) == 0
+
+    def test_12_concurrent_leaderboard_refresh(self, client, admin_client,
+                                               user_client):
+        titles, categories, _ = create_titles(admin_client)
+        first_id, second_id = titles[0]['id'], titles[1]['id']
+        top_url = f'/api/v1/categories/{categories[0]["slug"]}/top/'
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=second_id),
+            data={'category': categories[0]['slug']}, format='json'
+        )
+        create_single_review(user_client, first_id, 'Отзыв', 5)
+        assert [title['id'] for title in client.get(top_url).json()] == [
+            first_id
+        ]
+
+        category_id = Title.objects.get(pk=first_id).category_id
+        version = leaderboards._version()
+        key = leaderboards._key(
+            leaderboards.CATEGORY, category_id, version,
+            leaderboards._stamp(leaderboards.CATEGORY, category_id, version)
+        )
+        stale = cache.get(key)
+        # Лист в это время правит другой процесс.
+        cache.add(f'{key}:lock', True)
+        create_single_review(user_client, second_id, 'Отзыв', 9)
+        cache.set(key, stale)
+        cache.delete(f'{key}:lock')
+        assert [title['id'] for title in client.get(top_url).json()] == [
+            second_id, first_id
+        ], (
+            'Проверьте, что параллельное обновление листа другим '
+            'процессом не оставляет в кэше устаревший лист.'
+        )
+
+    def test_13_bulk_author_delete_recomputes_once(self, django_user_model,
+                                                   monkeypatch):
+        titles = [
+            Title.objects.create(name=f'Общий рейтинг {idx}', year=2000)
+            for idx in range(2)
+        ]
+        authors = [
+            django_user_model.objects.create_user(
+                username=f'bulkauthor{idx}', email=f'bulkauthor{idx}@yamdb.fake'
+            )
+            for idx in range(3)
+        ]
+        for score, author in enumerate(authors, 2):
+            for title in titles:
+                Review.objects.create(
+                    title=title, author=author, text='Отзыв', score=score
+                )
+        Review.objects.create(
+            title=titles[0], author=django_user_model.objects.create_user(
+                username='keeper', email='keeper@yamdb.fake'
+            ), text='Отзыв', score=9
+        )
+        calls = []
+        recompute_ratings = ratings.recompute_ratings
+
+        def count_recompute(title_ids):
+            calls.append(set(title_ids))
+            return recompute_ratings(title_ids)
+
+        monkeypatch.setattr(ratings, 'recompute_ratings', count_recompute)
+        django_user_model.objects.filter(
+            username__startswith='bulkauthor'
+        ).delete()
+        assert calls == [{title.pk for title in titles}], (
+            'Проверьте, что при удалении нескольких пользователей одним '
+            'запросом рейтинг их произведений пересчитывается один раз.'
+        )
+        assert [
+            Title.objects.get(pk=title.pk).rating for title in titles
+        ] == [9, None]
@@ -0,0 +1,399 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.apps import apps as django_apps
+from django.core.cache import cache
+from django.core.exceptions import ImproperlyConfigured
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from api import cache as response_cache
+from api.management.commands.explain_queries import (
+    Command as ExplainQueriesCommand
+)
+from reviews.models import Comment, Review, Title
+from tests.utils import create_reviews, create_single_review, create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test09QueryBudget:
+
+    TITLES_URL = '/api/v1/titles/'
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+
+    def count_queries(self, client, url):
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        return len(context.captured_queries)
+
+    def add_titles(self, admin_client, count):
+        for idx in range(count):
+            response = admin_client.post(self.TITLES_URL, data={
+                'name': f'Произведение {idx}',
+                'year': 2000,
+                'genre': ['horror', 'comedy'],
+                'category': 'films',
+            })
+            assert response.status_code == HTTPStatus.CREATED
+
+    def test_01_title_list_queries_do_not_grow(self, client, admin_client):
+        create_titles(admin_client)
+        queries_for_two = self.count_queries(client, self.TITLES_URL)
+        self.add_titles(admin_client, 3)
+        queries_for_page = self.count_queries(client, self.TITLES_URL)
+        assert queries_for_page == queries_for_two <= 3, (
+            f'Проверьте, что GET-запрос к `{self.TITLES_URL}` выполняет '
+            'постоянное число запросов к БД независимо от количества '
+            'произведений на странице: подгружайте категорию и жанры '
+            f'заранее. Сейчас запросов: {queries_for_two} и '
+            f'{queries_for_page}.'
+        )
+
+    def test_02_title_detail_and_write_queries(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        url = self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        assert self.count_queries(client, url) <= 2, (
+            f'Проверьте, что GET-запрос к `{self.TITLE_DETAIL_URL_TEMPLATE}` '
+            'получает произведение, категорию и жанры не более чем '
+            'двумя запросами к БД.'
+        )
+        queries = []
+        for genres in (['drama'], ['horror', 'comedy', 'drama']):
+            with CaptureQueriesContext(connection) as context:
+                admin_client.post(self.TITLES_URL, data={
+                    'name': 'Жанры', 'year': 2000, 'genre': genres,
+                    'category': 'films',
+                })
+            queries.append(sum(
+                'WHERE "reviews_genre"."slug"' in query['sql']
+                for query in context.captured_queries
+            ))
+        assert queries == [1, 1], (
+            f'Проверьте, что POST-запрос к `{self.TITLES_URL}` находит '
+            'все жанры по slug одним запросом к БД.'
+        )
+        response = admin_client.patch(url, data={'genre': ['drama']})
+        assert [genre['slug'] for genre in response.json()['genre']] == [
+            'drama'
+        ], (
+            f'Проверьте, что ответ на PATCH-запрос к '
+            f'`{self.TITLE_DETAIL_URL_TEMPLATE}` содержит новые жанры.'
+        )
+
+    def test_03_review_list_queries_do_not_grow(self, client, admin_client,
+                                                admin, user_client, user,
+                                                moderator_client):
+        _, titles = create_reviews(admin_client, {
+            admin: admin_client, user: user_client
+        })
+        url = self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        queries_for_two = self.count_queries(client, url)
+        response = moderator_client.post(
+            url, data={'text': 'Отзыв', 'score': 5}
+        )
+        assert response.status_code == HTTPStatus.CREATED
+        assert self.count_queries(client, url) == queries_for_two, (
+            f'Проверьте, что GET-запрос к `{self.REVIEWS_URL_TEMPLATE}` '
+            'выполняет постоянное число запросов к БД: подгружайте '
+            'авторов отзывов заранее.'
+        )
+
+    def test_04_title_responses_are_cached(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        title = Title.objects.get(pk=titles[0]['id'])
+        url = self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=title.pk)
+        for cached_url in (url, self.TITLES_URL):
+            self.count_queries(client, cached_url)
+            assert self.count_queries(client, cached_url) == 0, (
+                f'Проверьте, что повторный GET-запрос к `{cached_url}` '
+                'отдается из кэша без запросов к БД.'
+            )
+
+        title.category.name = 'Новое название категории'
+        title.category.save()
+        for cached_url in (url, self.TITLES_URL):
+            data = client.get(cached_url).json()
+            if 'results' in data:
+                data = next(
+                    item for item in data['results']
+                    if item['id'] == title.pk
+                )
+            assert data['category']['name'] == title.category.name, (
+                f'Проверьте, что ответ на GET-запрос к `{cached_url}` '
+                'обновляется после изменения категории произведения.'
+            )
+
+        admin_client.patch(url, data={'name': 'Новое название'})
+        assert client.get(url).json()['name'] == 'Новое название', (
+            f'Проверьте, что ответ на GET-запрос к '
+            f'`{self.TITLE_DETAIL_URL_TEMPLATE}` обновляется после '
+            'изменения произведения.'
+        )
+
+    def test_05_conditional_get(self, client, admin_client, user_client):
+        titles, _, _ = create_titles(admin_client)
+        urls = (
+            '/api/v1/genres/',
+            self.TITLES_URL,
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[0]['id']),
+            self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id']),
+        )
+        etags = {}
+        for url in urls:
+            response = client.get(url)
+            etags[url] = response.get('ETag')
+            assert etags[url] and response.get('Last-Modified'), (
+                f'Проверьте, что ответ на GET-запрос к `{url}` содержит '
+                'заголовки ETag и Last-Modified.'
+            )
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            assert response.status_code == HTTPStatus.NOT_MODIFIED, (
+                f'Проверьте, что GET-запрос к `{url}` с актуальным '
+                'If-None-Match возвращает статус 304.'
+            )
+            assert not context.captured_queries, (
+                f'Проверьте, что ответ 304 на GET-запрос к `{url}` '
+                'отдается без запросов к БД.'
+            )
+            response = client.get(
+                url, HTTP_IF_MODIFIED_SINCE=response['Last-Modified']
+            )
+            assert response.status_code == HTTPStatus.NOT_MODIFIED
+
+        admin_client.post(
+            '/api/v1/genres/', data={'name': 'Новый жанр', 'slug': 'new'}
+        )
+        create_single_review(user_client, titles[0]['id'], 'Отзыв', 7)
+        for url in urls:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            assert response.status_code == HTTPStatus.OK, (
+                f'Проверьте, что после изменения данных GET-запрос к '
+                f'`{url}` со старым If-None-Match возвращает статус 200.'
+            )
+
+    def test_06_fast_read_serializer(self, client, admin_client, settings):
+        create_titles(admin_client)
+        self.add_titles(admin_client, 3)
+        url = f'{self.TITLES_URL}?count=false'
+        expected = client.get(url).json()
+        settings.TITLES_FAST_READ = True
+        cache.clear()
+        queries = self.count_queries(client, url)
+        assert client.get(url).json() == expected, (
+            'Проверьте, что TitleFastReadSerializer возвращает тот же '
+            'JSON, что и TitleReadSerializer.'
+        )
+        assert queries <= 2, (
+            'Проверьте, что быстрый путь собирает страницу произведений '
+            'с категориями и жанрами двумя запросами к БД.'
+        )
+
+        out = StringIO()
+        call_command(
+            'benchmark_serializers', generate=30, repeat=2, stdout=out
+        )
+        assert 'Ускорение' in out.getvalue()
+
+    def test_07_query_plans_use_indexes(self):
+        out = StringIO()
+        call_command('explain_queries', stdout=out)
+        assert 'полных просмотров нет' in out.getvalue()
+
+        plan = ['SCAN reviews_title']
+        assert ExplainQueriesCommand.full_scans(
+            'SELECT * FROM "reviews_title" WHERE "name" LIKE %s', plan
+        ) == ['reviews_title'], (
+            'Проверьте, что explain_queries находит полный просмотр '
+            'большой таблицы.'
+        )
+        plan = ['SCAN reviews_title USING COVERING INDEX title_year_idx']
+        assert ExplainQueriesCommand.full_scans(
+            'SELECT COUNT(*) FROM "reviews_title"', plan
+        ) == ['reviews_title'], (
+            'Проверьте, что explain_queries считает полным и просмотр '
+            'таблицы в порядке индекса.'
+        )
+
+    def test_08_sparse_fieldsets(self, client, admin_client, admin,
+                                 user_client, user):
+        _, titles = create_reviews(admin_client, {
+            admin: admin_client, user: user_client
+        })
+        cases = (
+            (self.TITLES_URL, {'fields': 'id,name,rating'},
+             ['id', 'name', 'rating'], ('description', 'reviews_genre')),
+            (self.TITLES_URL, {'omit': 'description,category'},
+             ['id', 'name', 'year', 'rating', 'genre'],
+             ('description', 'reviews_category')),
+            (self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id']),
+             {'fields': 'id,score'}, ['id', 'score'],
+             ('"text"', 'users_user')),
+        )
+        for url, params, expected_fields, absent in cases:
+            with CaptureQueriesContext(connection) as context:
+                response = client.get(url, params)
+            assert response.status_code == HTTPStatus.OK
+            assert list(response.json()['results'][0]) == expected_fields, (
+                f'Проверьте, что GET-запрос к `{url}` с параметрами '
+                f'{params} возвращает только поля {expected_fields}.'
+            )
+            sql = ' '.join(query['sql'] for query in context.captured_queries)
+            for name in absent:
+                assert name not in sql, (
+                    f'Проверьте, что GET-запрос к `{url}` с параметрами '
+                    f'{params} не читает из БД {name}.'
+                )
+
+        response = client.get(self.TITLES_URL, {'fields': 'id,unknown'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что ?fields= с неизвестным полем возвращает '
+            'ответ со статусом 400.'
+        )
+
+    def test_09_title_detail_expand(self, client, admin_client, admin,
+                                    user_client, user):
+        _, titles = create_reviews(admin_client, {
+            admin: admin_client, user: user_client
+        })
+        url = self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        params = {'expand': 'reviews,rating_distribution'}
+        with CaptureQueriesContext(connection) as context:
+            data = client.get(url, params).json()
+        reviews = client.get(
+            self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        ).json()['results']
+        assert data['reviews'] == reviews, (
+            f'Проверьте, что ?expand=reviews в `{url}` встраивает '
+            'последние отзывы с авторами в том же виде, что и список '
+            'отзывов.'
+        )
+        assert data['rating_distribution']['review_count'] == len(reviews)
+        assert len(context.captured_queries) <= 4, (
+            'Проверьте, что карточка произведения с ?expand= собирается '
+            'не более чем четырьмя запросами к БД.'
+        )
+
+        user_client.patch(
+            f'{self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]["id"])}'
+            f'{reviews[0]["id"]}/',
+            data={'text': 'Новый текст отзыва'}
+        )
+        assert client.get(url, params).json()['reviews'][0]['text'] == (
+            'Новый текст отзыва'
+        ), (
+            'Проверьте, что закэшированная карточка с ?expand=reviews '
+            'обновляется после изменения отзыва.'
+        )
+        response = client.get(url, {'expand': 'comments'})
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_10_title_batch(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        self.add_titles(admin_client, 3)
+        ids = [titles[1]['id'], 10 ** 6, titles[0]['id'], titles[1]['id']]
+        url = f'{self.TITLES_URL}batch/?ids={",".join(map(str, ids))}'
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url)
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert [title['id'] for title in data] == [
+            titles[1]['id'], titles[0]['id']
+        ], (
+            f'Проверьте, что GET-запрос к `{self.TITLES_URL}batch/` '
+            'возвращает произведения в порядке ?ids= без повторов '
+            'и пропускает несуществующие id.'
+        )
+        assert data[0] == client.get(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[1]['id'])
+        ).json()
+        assert len(context.captured_queries) <= 2, (
+            f'Проверьте, что GET-запрос к `{self.TITLES_URL}batch/` '
+            'подгружает категории и жанры общими запросами к БД.'
+        )
+        for ids in ('', '1,x', '1,99999999999999999999999'):
+            response = client.get(f'{self.TITLES_URL}batch/', {'ids': ids})
+            assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_11_shared_cache_check(self, settings):
+        settings.DEBUG = False
+        with pytest.raises(ImproperlyConfigured):
+            django_apps.get_app_config('api').ready()
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.db.DatabaseCache',
+            'LOCATION': 'cache',
+        }}
+        django_apps.get_app_config('api').ready()
+        settings.DEBUG = True
+        settings.CACHES = {'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }}
+        django_apps.get_app_config('api').ready()
+
+    def test_12_cascade_delete_invalidates_once(self, client, admin_client,
+                                                django_user_model,
+                                                monkeypatch):
+        titles, _, _ = create_titles(admin_client)
+        author = django_user_model.objects.create_user(
+            username='cascade', email='cascade@yamdb.fake'
+        )
+        reviews = [
+            Review.objects.create(
+                title_id=title['id'], author=author, text='Отзыв', score=5
+            )
+            for title in titles
+        ]
+        Comment.objects.bulk_create(
+            Comment(review=review, author=author, text='Комментарий')
+            for review in reviews for _ in range(5)
+        )
+        urls = [
+            *(self.REVIEWS_URL_TEMPLATE.format(title_id=title['id'])
+              for title in titles),
+            *(f'{self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]["id"])}'
+              f'{review.pk}/comments/' for review in reviews[:1]),
+        ]
+        etags = {url: client.get(url)['ETag'] for url in urls}
+
+        calls = []
+        invalidate = response_cache.invalidate
+        monkeypatch.setattr(
+            response_cache, 'invalidate',
+            lambda keys: calls.append(keys) or invalidate(keys)
+        )
+        with CaptureQueriesContext(connection) as context:
+            author.delete()
+        assert len(calls) <= 3, (
+            'Проверьте, что удаление пользователя сбрасывает кэш отзывов '
+            'и комментариев одним вызовом, а не по каждой строке.'
+        )
+        assert any(
+            query['sql'].startswith('DELETE FROM "reviews_comment" WHERE '
+                                    '"reviews_comment"."author_id" IN')
+            for query in context.captured_queries
+        ), (
+            'Проверьте, что комментарии удаляемого пользователя '
+            'удаляются одним запросом без загрузки строк.'
+        )
+        for url in urls:
+            response = client.get(url, HTTP_IF_NONE_MATCH=etags[url])
+            assert response.status_code != HTTPStatus.NOT_MODIFIED, (
+                f'Проверьте, что после удаления автора `{url}` не '
+                'отвечает 304 по старому ETag.'
+            )
+
+        url = self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        review_id = create_single_review(
+            admin_client, titles[0]['id'], 'Отзыв', 3
+        ).json()['id']
+        etag = client.get(url)['ETag']
+        admin_client.delete(f'{url}{review_id}/')
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что после удаления отзыва `{url}` не отвечает '
+            '304 по старому ETag.'
+        )
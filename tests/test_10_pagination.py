@@ -0,0 +1,133 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tests.utils import create_reviews, create_single_review, create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test10Pagination:
+
+    TITLES_URL = '/api/v1/titles/'
+    REVIEWS_URL_TEMPLATE = '/api/v1/titles/{title_id}/reviews/'
+
+    def crawl(self, client, url):
+        ids = []
+        while url:
+            response = client.get(url)
+            assert response.status_code == HTTPStatus.OK
+            data = response.json()
+            assert 'count' not in data, (
+                'Проверьте, что в режиме курсора ответ не содержит '
+                'ключ `count`.'
+            )
+            ids.extend(obj['id'] for obj in data['results'])
+            url = data['next']
+        return ids
+
+    def test_01_titles_cursor_pagination(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        for idx in range(5):
+            response = admin_client.post(self.TITLES_URL, data={
+                'name': f'Произведение {idx}',
+                'year': 2000,
+                'genre': ['drama'],
+                'category': 'books',
+            })
+            titles.append(response.json())
+        ids = self.crawl(client, f'{self.TITLES_URL}?pagination=cursor')
+        assert ids == sorted(title['id'] for title in titles), (
+            f'Проверьте, что `{self.TITLES_URL}?pagination=cursor` отдает '
+            'все произведения по возрастанию id по ссылкам `next`.'
+        )
+
+        response = client.get(self.TITLES_URL)
+        assert response.json()['count'] == len(titles), (
+            'Проверьте, что без параметра `pagination=cursor` сохраняется '
+            'пагинация по номеру страницы.'
+        )
+
+    def test_02_reviews_cursor_pagination(self, client, admin_client, admin,
+                                          user_client, user,
+                                          moderator_client, moderator):
+        reviews, titles = create_reviews(admin_client, {
+            admin: admin_client,
+            user: user_client,
+            moderator: moderator_client,
+        })
+        url = self.REVIEWS_URL_TEMPLATE.format(title_id=titles[0]['id'])
+        response = client.get(url, {'pagination': 'cursor'})
+        assert len(response.json()['results']) == len(reviews)
+        assert [review['id'] for review in response.json()['results']] == [
+            review['id'] for review in reversed(reviews)
+        ], (
+            f'Проверьте, что `{self.REVIEWS_URL_TEMPLATE}?pagination=cursor` '
+            'отдает отзывы от новых к старым.'
+        )
+
+    def test_03_titles_without_count(self, client, admin_client):
+        create_titles(admin_client)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.TITLES_URL, {'count': 'false'})
+        assert response.status_code == HTTPStatus.OK
+        data = response.json()
+        assert 'count' not in data and len(data['results']) == 2, (
+            f'Проверьте, что `{self.TITLES_URL}?count=false` возвращает '
+            'страницу без ключа `count`.'
+        )
+        assert not any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ), (
+            f'Проверьте, что `{self.TITLES_URL}?count=false` не выполняет '
+            'запрос COUNT(*).'
+        )
+        assert data['next'] is None
+
+    def test_04_titles_estimated_count(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        response = client.get(self.TITLES_URL, {'count': 'estimated'})
+        assert response.json()['count'] == len(titles)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.TITLES_URL, {'count': 'estimated'})
+        assert response.json()['count'] == len(titles)
+        assert not any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ), (
+            f'Проверьте, что `{self.TITLES_URL}?count=estimated` берет '
+            'количество произведений из кэша.'
+        )
+        response = client.get(
+            self.TITLES_URL, {'count': 'estimated', 'search': '-'}
+        )
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что `{self.TITLES_URL}?count=estimated` отвечает '
+            'на запрос с заведомо пустой выборкой статусом 200.'
+        )
+        assert response.json()['count'] == 0
+
+    def test_05_titles_exact_count_is_cached(self, client, admin_client,
+                                             user_client):
+        titles, _, _ = create_titles(admin_client)
+        assert client.get(self.TITLES_URL).json()['count'] == 2
+        create_single_review(user_client, titles[0]['id'], 'Отзыв', 7)
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(self.TITLES_URL)
+        assert response.json()['count'] == 2
+        assert not any(
+            'COUNT(' in query['sql'] for query in context.captured_queries
+        ), (
+            f'Проверьте, что `{self.TITLES_URL}` не пересчитывает '
+            'количество произведений после изменения рейтинга.'
+        )
+        admin_client.post(self.TITLES_URL, data={
+            'name': 'Новое', 'year': 2000, 'genre': ['drama'],
+            'category': 'books',
+        }, format='json')
+        assert client.get(self.TITLES_URL).json()['count'] == 3, (
+            f'Проверьте, что `{self.TITLES_URL}` пересчитывает количество '
+            'после добавления произведения.'
+        )
+        admin_client.delete(f'{self.TITLES_URL}{titles[0]["id"]}/')
+        assert client.get(self.TITLES_URL).json()['count'] == 2
@@ -0,0 +1,230 @@
+from http import HTTPStatus
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from reviews import autocomplete
+from reviews.search import NAME_INDEX_TABLE, SEARCH_INDEX_TABLE
+from tests.utils import create_titles
+
+
+@pytest.mark.django_db(transaction=True)
+class Test11TitleSearch:
+
+    TITLES_URL = '/api/v1/titles/'
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+
+    def search(self, client, query):
+        response = client.get(self.TITLES_URL, {'search': query})
+        assert response.status_code == HTTPStatus.OK
+        return [title['id'] for title in response.json()['results']]
+
+    def test_01_search_is_ranked_and_synced(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        response = admin_client.post(self.TITLES_URL, data={
+            'name': 'Ёжик в тумане',
+            'year': 1975,
+            'genre': ['comedy'],
+            'category': 'films',
+            'description': 'Мультфильм о ёжике и терминаторе',
+        })
+        hedgehog_id = response.json()['id']
+
+        for query in ('-', '"', '*:()'):
+            assert self.search(client, query) == [], (
+                'Проверьте, что ?search= из одних знаков препинания '
+                'возвращает пустой список, а не ошибку.'
+            )
+        assert self.search(client, 'ежик') == [hedgehog_id], (
+            'Проверьте, что ?search= находит произведения без учета '
+            'регистра и различия букв ё и е.'
+        )
+        assert self.search(client, 'термин') == [
+            titles[0]['id'], hedgehog_id
+        ], (
+            'Проверьте, что ?search= ищет по началу слов в названии и '
+            'описании и ставит совпадения в названии выше.'
+        )
+
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[1]['id']),
+            data={'name': 'Туманный орешек'}
+        )
+        admin_client.delete(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=hedgehog_id)
+        )
+        assert self.search(client, 'туман') == [titles[1]['id']], (
+            'Проверьте, что поисковый индекс обновляется при изменении '
+            'и удалении произведений.'
+        )
+
+    def test_02_rebuild_search_index(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        with connection.cursor() as cursor:
+            cursor.execute(f'DELETE FROM {SEARCH_INDEX_TABLE}')
+        assert self.search(client, 'орешек') == []
+
+        out = StringIO()
+        call_command('rebuild_search_index', stdout=out)
+        assert self.search(client, 'орешек') == [titles[1]['id']], (
+            'Проверьте, что команда rebuild_search_index заново '
+            'заполняет поисковый индекс.'
+        )
+
+    def test_03_name_filters_fold_cyrillic_case(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        response = client.get(self.TITLES_URL, {'name': 'КРЕПКИЙ'})
+        assert [title['id'] for title in response.json()['results']] == [
+            titles[1]['id']
+        ], (
+            'Проверьте, что фильтр ?name= по произведениям не учитывает '
+            'регистр кириллических букв.'
+        )
+        for name, expected in (('ий ОР', [titles[1]['id']]),
+                               ('ор', [titles[0]['id'], titles[1]['id']]),
+                               ('*', [])):
+            response = client.get(self.TITLES_URL, {'name': name})
+            assert [
+                title['id'] for title in response.json()['results']
+            ] == expected, (
+                'Проверьте, что фильтр ?name= находит подстроку '
+                'в любом месте названия.'
+            )
+        with CaptureQueriesContext(connection) as context:
+            client.get(self.TITLES_URL, {'name': 'орешек'})
+        assert any(
+            NAME_INDEX_TABLE in query['sql']
+            for query in context.captured_queries
+        ), (
+            'Проверьте, что фильтр ?name= ищет подстроку по '
+            'триграммному индексу названий.'
+        )
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[1]['id']),
+            data={'name': 'Стальной орешек'}
+        )
+        for name, expected in (('крепк', []), ('стальн', [titles[1]['id']])):
+            response = client.get(self.TITLES_URL, {'name': name})
+            assert [
+                title['id'] for title in response.json()['results']
+            ] == expected, (
+                'Проверьте, что индекс названий обновляется при '
+                'изменении произведения.'
+            )
+        response = client.get('/api/v1/genres/', {'search': 'уЖАСЫ'})
+        assert [genre['slug'] for genre in response.json()['results']] == [
+            'horror'
+        ], (
+            'Проверьте, что поиск ?search= по жанрам не учитывает '
+            'регистр кириллических букв.'
+        )
+
+    def test_04_autocomplete(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        url = '/api/v1/autocomplete/'
+        response = client.get(url, {'q': 'ОРЕШ'})
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос к `{url}` доступен без токена.'
+        )
+        assert response.json() == [{
+            'type': 'title', 'id': titles[1]['id'], 'name': 'Крепкий орешек'
+        }], (
+            f'Проверьте, что `{url}?q=` подсказывает произведения по '
+            'началу любого слова названия без учета регистра.'
+        )
+        assert client.get(url, {'q': 'ужа'}).json() == [
+            {'type': 'genre', 'slug': 'horror', 'name': 'Ужасы'}
+        ]
+
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[1]['id']),
+            data={'name': 'Ужасный орешек'}
+        )
+        with CaptureQueriesContext(connection) as context:
+            names = [item['name'] for item in client.get(
+                url, {'q': 'ужа'}
+            ).json()]
+        assert names == ['Ужасный орешек', 'Ужасы'], (
+            f'Проверьте, что подсказки `{url}` обновляются при изменении '
+            'названий.'
+        )
+        assert not context.captured_queries, (
+            f'Проверьте, что `{url}` отдает подсказки из памяти без '
+            'запросов к БД.'
+        )
+
+    def test_05_facets(self, client, admin_client):
+        create_titles(admin_client)
+        url = f'{self.TITLES_URL}facets/'
+        with CaptureQueriesContext(connection) as context:
+            response = client.get(url, {'category': 'films'})
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что GET-запрос к `{url}` доступен без токена.'
+        )
+        assert len(context.captured_queries) <= 4, (
+            f'Проверьте, что `{url}` считает фасеты несколькими '
+            'групповыми запросами.'
+        )
+        assert response.json() == {
+            'count': 1,
+            'genre': [
+                {'slug': 'comedy', 'name': 'Комедия', 'count': 1},
+                {'slug': 'horror', 'name': 'Ужасы', 'count': 1},
+            ],
+            'category': [{'slug': 'films', 'name': 'Фильм', 'count': 1}],
+            'year': [{'year': 1984, 'count': 1}],
+        }, (
+            f'Проверьте, что `{url}` возвращает количество произведений '
+            'по жанрам, категориям и годам с учетом фильтров.'
+        )
+
+    def test_06_multi_value_filters(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        terminator, die_hard = titles[0]['id'], titles[1]['id']
+        cases = (
+            ({'genre': 'horror,comedy'}, [terminator]),
+            ({'genre': 'horror,drama'}, [terminator, die_hard]),
+            ({'genre': 'horror,comedy', 'genre_mode': 'all'}, [terminator]),
+            ({'genre': 'horror,drama', 'genre_mode': 'all'}, []),
+            ({'category': 'films,books'}, [terminator, die_hard]),
+            ({'year_min': 1985}, [die_hard]),
+            ({'year_min': 1980, 'year_max': 1985}, [terminator]),
+        )
+        for params, expected in cases:
+            response = client.get(self.TITLES_URL, params)
+            assert response.status_code == HTTPStatus.OK
+            data = response.json()
+            assert [title['id'] for title in data['results']] == expected, (
+                f'Проверьте фильтрацию произведений с параметрами {params}: '
+                'произведения должны подходить под фильтр и не повторяться.'
+            )
+            assert data['count'] == len(expected)
+        response = client.get(
+            self.TITLES_URL, {'genre': 'horror', 'genre_mode': 'none'}
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+
+    def test_07_autocomplete_across_processes(self, client, admin_client,
+                                              monkeypatch):
+        titles, _, _ = create_titles(admin_client)
+        url = '/api/v1/autocomplete/'
+        assert client.get(url, {'q': 'ореш'}).json()[0]['name'] == (
+            'Крепкий орешек'
+        )
+        index = autocomplete._index
+        # Изменение обрабатывает другой процесс со своим индексом.
+        monkeypatch.setattr(autocomplete, '_index', autocomplete.PrefixIndex())
+        admin_client.patch(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=titles[1]['id']),
+            data={'name': 'Стальной орешек'}
+        )
+        monkeypatch.setattr(autocomplete, '_index', index)
+        assert client.get(url, {'q': 'ореш'}).json()[0]['name'] == (
+            'Стальной орешек'
+        ), (
+            f'Проверьте, что `{url}` видит изменения, сделанные другим '
+            'процессом, через версию каталога в общем кэше.'
+        )
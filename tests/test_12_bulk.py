@@ -0,0 +1,185 @@
+from http import HTTPStatus
+
+import pytest
+from django.db import connection
+from django.test.utils import CaptureQueriesContext
+
+from tests.utils import (
+    create_single_comment, create_single_review, create_titles
+)
+
+
+@pytest.mark.django_db(transaction=True)
+class Test12TitleBulk:
+
+    BULK_URL = '/api/v1/titles/bulk/'
+    TITLES_URL = '/api/v1/titles/'
+    TITLE_DETAIL_URL_TEMPLATE = '/api/v1/titles/{title_id}/'
+
+    def bulk_create(self, admin_client, count, prefix='Пакет'):
+        data = [
+            {
+                'name': f'{prefix} {idx}',
+                'year': 2000 + idx % 20,
+                'genre': ['horror', 'drama'],
+                'category': 'books',
+                'description': 'Загружено синхронизацией',
+            }
+            for idx in range(count)
+        ]
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.post(
+                self.BULK_URL, data=data, format='json'
+            )
+        assert response.status_code == HTTPStatus.CREATED, (
+            f'Проверьте, что POST-запрос администратора к `{self.BULK_URL}` '
+            'со списком произведений возвращает ответ со статусом 201.'
+        )
+        return response.json(), len(context.captured_queries)
+
+    def test_01_bulk_create(self, client, admin_client, user_client):
+        create_titles(admin_client)
+        assert client.get(self.TITLES_URL).json()['count'] == 2
+
+        created, queries_for_three = self.bulk_create(admin_client, 3)
+        assert [title['name'] for title in created] == [
+            'Пакет 0', 'Пакет 1', 'Пакет 2'
+        ]
+        assert created[0]['genre'] == [
+            {'name': 'Ужасы', 'slug': 'horror'},
+            {'name': 'Драма', 'slug': 'drama'},
+        ]
+        assert created[0]['category'] == {'name': 'Книги', 'slug': 'books'}
+        _, queries_for_fifty = self.bulk_create(admin_client, 50, 'Серия')
+        assert queries_for_fifty == queries_for_three, (
+            f'Проверьте, что POST-запрос к `{self.BULK_URL}` проверяет '
+            'и записывает произведения постоянным числом запросов к БД '
+            'независимо от их количества. Сейчас запросов: '
+            f'{queries_for_three} и {queries_for_fifty}.'
+        )
+
+        assert client.get(self.TITLES_URL).json()['count'] == 55, (
+            'Проверьте, что после массового создания список произведений '
+            'не отдается из устаревшего кэша.'
+        )
+        response = client.get(self.TITLES_URL, {'search': 'серия'})
+        assert response.json()['count'] == 50, (
+            'Проверьте, что массово созданные произведения попадают '
+            'в поисковый индекс.'
+        )
+        response = client.get('/api/v1/autocomplete/', {'q': 'паке'})
+        assert len(response.json()) == 3
+
+        response = admin_client.post(self.BULK_URL, data=[
+            {'name': 'Верное', 'year': 2000, 'genre': ['drama'],
+             'category': 'books'},
+            {'name': 'Без жанра', 'year': 2000, 'genre': ['unknown'],
+             'category': 'books'},
+        ], format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert client.get(self.TITLES_URL).json()['count'] == 55, (
+            'Проверьте, что при ошибке в одном произведении '
+            'не создается ни одно.'
+        )
+        response = user_client.post(self.BULK_URL, data=[], format='json')
+        assert response.status_code == HTTPStatus.FORBIDDEN
+
+    def test_02_bulk_update_and_delete(self, client, admin_client):
+        titles, _, _ = create_titles(admin_client)
+        first_id, second_id = titles[0]['id'], titles[1]['id']
+        response = admin_client.patch(self.BULK_URL, data=[
+            {'id': second_id, 'name': 'Ёлка', 'genre': ['comedy']},
+            {'id': first_id, 'year': 1991},
+        ], format='json')
+        assert response.status_code == HTTPStatus.OK, (
+            f'Проверьте, что PATCH-запрос администратора к '
+            f'`{self.BULK_URL}` со списком изменений возвращает '
+            'ответ со статусом 200.'
+        )
+        assert [title['id'] for title in response.json()] == [
+            second_id, first_id
+        ]
+        second = client.get(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=second_id)
+        ).json()
+        assert second['name'] == 'Ёлка'
+        assert second['genre'] == [{'name': 'Комедия', 'slug': 'comedy'}]
+        assert second['year'] == 1988
+        response = client.get(self.TITLES_URL, {'name': 'елка'})
+        assert [title['id'] for title in response.json()['results']] == [
+            second_id
+        ], (
+            'Проверьте, что массовое изменение обновляет '
+            'нормализованное название и кэш списка.'
+        )
+
+        response = admin_client.patch(self.BULK_URL, data=[
+            {'id': first_id, 'name': 'Не сохранится'},
+            {'id': 10 ** 6, 'name': 'Нет такого'},
+        ], format='json')
+        assert response.status_code == HTTPStatus.BAD_REQUEST
+        assert client.get(
+            self.TITLE_DETAIL_URL_TEMPLATE.format(title_id=first_id)
+        ).json()['name'] == 'Терминатор'
+
+        response = admin_client.delete(
+            self.BULK_URL, data=[first_id, second_id], format='json'
+        )
+        assert response.status_code == HTTPStatus.NO_CONTENT, (
+            f'Проверьте, что DELETE-запрос администратора к '
+            f'`{self.BULK_URL}` со списком id возвращает ответ '
+            'со статусом 204.'
+        )
+        assert client.get(self.TITLES_URL).json()['count'] == 0
+        response = client.get(self.TITLES_URL, {'search': 'терминатор'})
+        assert response.json()['count'] == 0
+
+    def bulk_delete(self, admin_client, title_ids):
+        with CaptureQueriesContext(connection) as context:
+            response = admin_client.delete(
+                self.BULK_URL, data=title_ids, format='json'
+            )
+        assert response.status_code == HTTPStatus.NO_CONTENT
+        return len(context.captured_queries)
+
+    def test_03_bulk_delete_queries(self, client, admin_client, user_client):
+        create_titles(admin_client)
+        small, _ = self.bulk_create(admin_client, 5, prefix='Малый')
+        big, _ = self.bulk_create(admin_client, 50, prefix='Большой')
+        title_id = small[0]['id']
+        review_id = create_single_review(
+            user_client, title_id, 'Отзыв', 5
+        ).json()['id']
+        create_single_comment(user_client, title_id, review_id, 'Коммент')
+        reviews_url = f'/api/v1/titles/{title_id}/reviews/'
+        assert client.get(reviews_url).json()['count'] == 1
+
+        small_queries = self.bulk_delete(
+            admin_client, [title['id'] for title in small]
+        )
+        big_queries = self.bulk_delete(
+            admin_client, [title['id'] for title in big]
+        )
+        assert big_queries == small_queries, (
+            'Проверьте, что массовое удаление произведений выполняет '
+            'одно и то же число запросов независимо от их количества: '
+            f'5 произведений - {small_queries}, 50 - {big_queries}.'
+        )
+        assert client.get(self.TITLES_URL).json()['count'] == 2
+        assert client.get(reviews_url).json()['count'] == 0, (
+            'Проверьте, что массовое удаление сбрасывает кэш отзывов '
+            'удаленных произведений.'
+        )
+        for params in ({'search': 'малый'}, {'name': 'большой'}):
+            assert client.get(self.TITLES_URL, params).json()['count'] == 0, (
+                'Проверьте, что массовое удаление убирает произведения '
+                'из индекса поиска.'
+            )
+        assert client.get('/api/v1/autocomplete/', {'q': 'мал'}).json() == []
+        response = admin_client.delete(
+            self.BULK_URL, data=[10 ** 20], format='json'
+        )
+        assert response.status_code == HTTPStatus.BAD_REQUEST, (
+            'Проверьте, что id вне диапазона BIGINT в массовом удалении '
+            'возвращают ответ со статусом 400.'
+        )